@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015:
+#     Sébastien Pasche, sebastien.pasche@leshop.ch
+#     Benoit Chalut, benoit.chalut@leshop.ch
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+
+author = "Sebastien Pasche"
+maintainer = "Sebastien Pasche"
+version = "0.0.1"
+
+import optparse
+import sys
+import os
+import subprocess
+
+# Ok try to load our directory to load the plugin utils.
+my_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_dir)
+
+try:
+    from redis_checks import TimingHelpers
+except ImportError:
+    print "ERROR : this benchmark needs the local redis_checks lib. Please install it"
+    sys.exit(2)
+
+#DEFAULTS
+#--------
+DEFAULT_RUNS = 20
+DEFAULT_CHECK = 'check_redis_ping.py'
+
+# OPT parsing
+# -----------
+parser = optparse.OptionParser(
+    "%prog [options] [-- check options]", version="%prog " + version)
+
+parser.add_option('-n', '--runs',
+                  dest="runs", type="int", default=DEFAULT_RUNS,
+                  help='Number of runs of the check per client. Default : {d}'.format(d=DEFAULT_RUNS)
+)
+parser.add_option('--check',
+                  dest="check", type="str", default=DEFAULT_CHECK,
+                  help='Check script to start. Default : {d}'.format(d=DEFAULT_CHECK)
+)
+
+
+def run_check(
+        command,
+        runs
+):
+    """
+    Start a check over and over
+    :param command: check command line
+    :param runs: number of runs
+    :return: list of wall clock times of the runs, in [ms], raises if a
+             run does not exit OK
+    """
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for i in range(runs):
+            start_time = TimingHelpers.monotonic()
+            returncode = subprocess.call(command, stdout=devnull, stderr=devnull)
+            times.append((TimingHelpers.monotonic() - start_time) * 1000)
+
+            #a failed check does not time a normal run
+            if returncode != 0:
+                raise Exception("{c} exited with {r}".format(c=' '.join(command), r=returncode))
+
+    return times
+
+
+if __name__ == '__main__':
+    opts, args = parser.parse_args()
+
+    command = [sys.executable, os.path.join(my_dir, opts.check)] + args
+
+    results = []
+    try:
+        for name, client_args in [('redis-py', []), ('resp', ['--resp'])]:
+            times = run_check(command + client_args, opts.runs)
+            results.append((name, times))
+    except Exception as e:
+        print("Error: {m}".format(m=e))
+        sys.exit(2)
+
+    print("{c} {a}, {n} runs".format(c=opts.check, a=' '.join(args), n=opts.runs))
+    for name, times in results:
+        print("{n:<8} min {mi:.1f} ms, p50 {p:.1f} ms, max {ma:.1f} ms".format(
+            n=name,
+            mi=min(times),
+            p=TimingHelpers.percentile(times, 50),
+            ma=max(times)
+        ))
+
+    baseline = TimingHelpers.percentile(results[0][1], 50)
+    resp = TimingHelpers.percentile(results[1][1], 50)
+    print("--resp saves {s:.1f} ms per run ({p:.0f}%)".format(
+        s=baseline - resp,
+        p=(baseline - resp) / baseline * 100
+    ))
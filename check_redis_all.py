@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015:
+#     Sébastien Pasche, sebastien.pasche@leshop.ch
+#     Benoit Chalut, benoit.chalut@leshop.ch
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+author = "Sebastien Pasche"
+maintainer = "Sebastien Pasche"
+version = "0.0.1"
+
+import optparse
+import sys
+import traceback
+import os
+
+# Ok try to load our directory to load the plugin utils.
+my_dir = os.path.dirname(__file__)
+sys.path.insert(0, my_dir)
+
+try:
+    from redis_checks import \
+        RedisCheckHelpers, RedisCheckEvaluators, OutputFormatHelpers, \
+        RedisDeadlineError, RedisCircuitOpenError, NAGIOS_EXIT_CODES
+except ImportError:
+    print "ERROR : this plugin needs the local redis_checks lib. Please install it"
+    sys.exit(2)
+
+#DEFAULT LIMITS
+#--------------
+DEFAULT_MEMORY_WARNING = 50000000
+DEFAULT_MEMORY_CRITICAL = 50000000
+DEFAULT_MAXMEMORY_WARNING = 80.00
+DEFAULT_MAXMEMORY_CRITICAL = 90.00
+DEFAULT_CONNECTED_CLIENTS_WARNING = 2000
+DEFAULT_CONNECTED_CLIENTS_CRITICAL = 5000
+DEFAULT_BLOCKED_CLIENTS_WARNING = 100
+DEFAULT_BLOCKED_CLIENTS_CRITICAL = 200
+
+AVAILABLE_CHECKS = ['memory', 'maxmemory', 'connected_clients', 'blocked_clients']
+
+# OPT parsing
+# -----------
+parser = optparse.OptionParser(
+    "%prog [options]", version="%prog " + version)
+
+# add default parser
+parser = RedisCheckHelpers.add_default_parser_options(parser)
+
+parser.add_option('--checks',
+                  dest="checks", type="str", default=','.join(AVAILABLE_CHECKS),
+                  help='Comma separated list of checks to run. Default : {d}'.format(d=','.join(AVAILABLE_CHECKS))
+)
+parser.add_option('--per-check',
+                  dest="per_check", default=False, action="store_true",
+                  help='Print one result line per check instead of one aggregated line. Ignored with --hosts, --cluster and --sentinels'
+)
+parser.add_option('--memory-warning',
+                  dest="memory_warning", type="float",
+                  help='Warning value for used memory. In [B]. Default : {d} [B]'.format(d=DEFAULT_MEMORY_WARNING)
+)
+parser.add_option('--memory-critical',
+                  dest="memory_critical", type="float",
+                  help='Critical value for used memory. In [B]. Default : {d} [B]'.format(d=DEFAULT_MEMORY_CRITICAL)
+)
+parser.add_option('--maxmemory-warning',
+                  dest="maxmemory_warning", type="float",
+                  help='Warning value for used memory. In [%]. Default : {d} [%]'.format(d=DEFAULT_MAXMEMORY_WARNING)
+)
+parser.add_option('--maxmemory-critical',
+                  dest="maxmemory_critical", type="float",
+                  help='Critical value for used memory. In [%]. Default : {d} [%]'.format(d=DEFAULT_MAXMEMORY_CRITICAL)
+)
+parser.add_option('--connected-clients-warning',
+                  dest="connected_clients_warning", type="float",
+                  help='Warning value for connected clients. Default : {d}'.format(d=DEFAULT_CONNECTED_CLIENTS_WARNING)
+)
+parser.add_option('--connected-clients-critical',
+                  dest="connected_clients_critical", type="float",
+                  help='Critical value for connected clients. Default : {d}'.format(d=DEFAULT_CONNECTED_CLIENTS_CRITICAL)
+)
+parser.add_option('--blocked-clients-warning',
+                  dest="blocked_clients_warning", type="float",
+                  help='Warning value for blocked clients. Default : {d}'.format(d=DEFAULT_BLOCKED_CLIENTS_WARNING)
+)
+parser.add_option('--blocked-clients-critical',
+                  dest="blocked_clients_critical", type="float",
+                  help='Critical value for blocked clients. Default : {d}'.format(d=DEFAULT_BLOCKED_CLIENTS_CRITICAL)
+)
+
+def run_checks(
+        redis_con,
+        checks,
+        thresholds,
+        debug=False
+):
+    """
+    Evaluate every selected check from one INFO snapshot
+    :param checks: list of checks from AVAILABLE_CHECKS
+    :param thresholds: dict of check -> (warning, critical)
+    :return: list of (check, (status, message, perfdata))
+    """
+    #get data
+    #--------
+
+    #get redis_info once for every check, only the needed sections
+    info_sections = []
+    for check in checks:
+        for section in RedisCheckEvaluators.INFO_SECTIONS[check]:
+            if section not in info_sections:
+                info_sections.append(section)
+
+    #config values are only fetched when a check needs them, in the INFO
+    #round trip
+    parameters = []
+    if 'memory' in checks or 'maxmemory' in checks:
+        parameters.append('maxmemory')
+        if 'memory' not in info_sections:
+            info_sections.append('memory')
+    if 'connected_clients' in checks:
+        parameters.append('maxclients')
+
+    redis_info, config = RedisCheckHelpers.get_info_and_config(
+        redis_con=redis_con,
+        sections=info_sections,
+        parameters=parameters,
+        debug=debug
+    )
+
+    redis_maxmemory = None
+    if 'maxmemory' in parameters:
+        redis_maxmemory = RedisCheckHelpers.config_maxmemory(
+            redis_info,
+            config,
+            check_zero=False,
+            debug=debug
+        )
+
+    redis_maxclients = ''
+    if 'maxclients' in parameters:
+        if isinstance(config['maxclients'], Exception):
+            raise config['maxclients']
+        redis_maxclients = long(config['maxclients'])
+
+        if debug:
+            print("maxclients: {m}".format(m=redis_maxclients))
+
+    #check logic
+    results = []
+    for check in checks:
+        warning, critical = thresholds[check]
+        try:
+            if check == 'memory':
+                result = RedisCheckEvaluators.memory(
+                    redis_info,
+                    redis_maxmemory or '',
+                    warning,
+                    critical,
+                    debug=debug
+                )
+            elif check == 'maxmemory':
+                if not redis_maxmemory:
+                    raise Exception("maxmemory = 0 cannot evaluate usage")
+                result = RedisCheckEvaluators.maxmemory(
+                    redis_info,
+                    redis_maxmemory,
+                    warning,
+                    critical,
+                    debug=debug
+                )
+            elif check == 'connected_clients':
+                result = RedisCheckEvaluators.connected_clients(
+                    redis_info,
+                    redis_maxclients,
+                    warning,
+                    critical,
+                    debug=debug
+                )
+            else:
+                result = RedisCheckEvaluators.blocked_clients(
+                    redis_info,
+                    warning,
+                    critical,
+                    debug=debug
+                )
+        except Exception as e:
+            result = ("Unknown", "{m}".format(m=e), [])
+
+        results.append((check, result))
+
+    return results
+
+
+def check_all(
+        redis_con,
+        checks,
+        thresholds,
+        debug=False
+):
+    """
+    Evaluate every selected check and aggregate them in one result
+    :return: (worst status, joined messages, every perf data)
+    """
+    results = run_checks(
+        redis_con,
+        checks,
+        thresholds,
+        debug=debug
+    )
+
+    status = OutputFormatHelpers.worst_state(
+        [state for check, (state, message, perfdata) in results]
+    )
+
+    perfdata = []
+    for check, (check_status, message, check_perfdata) in results:
+        perfdata.extend(check_perfdata)
+
+    message = ', '.join(message for check, (s, message, p) in results)
+
+    return status, message, perfdata
+
+
+if __name__ == '__main__':
+    # Ok first job : parse args
+    opts, args = parser.parse_args()
+    if args:
+        parser.error("Does not accept any argument.")
+
+    debug = opts.debug
+
+    checks = [c.strip() for c in opts.checks.split(',') if c.strip()]
+    for check in checks:
+        if check not in AVAILABLE_CHECKS:
+            parser.error("Unknown check {c}. Available : {a}".format(
+                c=check,
+                a=','.join(AVAILABLE_CHECKS)
+            ))
+
+    # Try to get nermic warning/critical values
+    thresholds = {
+        'memory': (
+            opts.memory_warning or DEFAULT_MEMORY_WARNING,
+            opts.memory_critical or DEFAULT_MEMORY_CRITICAL
+        ),
+        'maxmemory': (
+            opts.maxmemory_warning or DEFAULT_MAXMEMORY_WARNING,
+            opts.maxmemory_critical or DEFAULT_MAXMEMORY_CRITICAL
+        ),
+        'connected_clients': (
+            opts.connected_clients_warning or DEFAULT_CONNECTED_CLIENTS_WARNING,
+            opts.connected_clients_critical or DEFAULT_CONNECTED_CLIENTS_CRITICAL
+        ),
+        'blocked_clients': (
+            opts.blocked_clients_warning or DEFAULT_BLOCKED_CLIENTS_WARNING,
+            opts.blocked_clients_critical or DEFAULT_BLOCKED_CLIENTS_CRITICAL
+        )
+    }
+
+    try:
+        if opts.per_check and not (opts.hosts or opts.cluster or opts.sentinels):
+            try:
+                results = RedisCheckHelpers.check_target(
+                    opts,
+                    opts.hostname,
+                    opts.port,
+                    run_checks,
+                    checks=checks,
+                    thresholds=thresholds
+                )
+
+                status = OutputFormatHelpers.worst_state(
+                    [state for check, (state, message, perfdata) in results]
+                )
+
+                #output formating
+                output = '\n'.join(
+                    OutputFormatHelpers.check_output_string(
+                        check_status,
+                        '{c}: {m}'.format(c=check, m=message),
+                        perfdata
+                    )
+                    for check, (check_status, message, perfdata) in results
+                )
+            except (RedisDeadlineError, RedisCircuitOpenError) as e:
+                status, output = RedisCheckHelpers.error_output(opts, e)
+
+            print(RedisCheckHelpers.timings_output(opts, output))
+        else:
+            status, output = RedisCheckHelpers.run_check(
+                opts,
+                check_all,
+                checks=checks,
+                thresholds=thresholds
+            )
+
+            print(output)
+
+    except Exception as e:
+        status = "Critical"
+        if debug:
+            print(e)
+            the_type, value, tb = sys.exc_info()
+            traceback.print_tb(tb)
+        print("Error: {m}".format(m=e))
+        sys.exit(2)
+
+    finally:
+        sys.exit(NAGIOS_EXIT_CODES[status])
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015:
+#     Sébastien Pasche, sebastien.pasche@leshop.ch
+#     Benoit Chalut, benoit.chalut@leshop.ch
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+author = "Sebastien Pasche"
+maintainer = "Sebastien Pasche"
+version = "0.0.1"
+
+import optparse
+import sys
+import traceback
+import os
+import heapq
+
+# Ok try to load our directory to load the plugin utils.
+my_dir = os.path.dirname(__file__)
+sys.path.insert(0, my_dir)
+
+try:
+    from redis_checks import \
+        RedisCheckHelpers, RedisCheckEvaluators, OutputFormatHelpers, TimingHelpers, \
+        NAGIOS_EXIT_CODES
+except ImportError:
+    print "ERROR : this plugin needs the local redis_checks lib. Please install it"
+    sys.exit(2)
+
+#DEFAULT LIMITS
+#--------------
+DEFAULT_WARNING = 100000000
+DEFAULT_CRITICAL = 500000000
+DEFAULT_TIME_BUDGET = 1.0
+DEFAULT_KEY_BUDGET = 10000
+DEFAULT_BATCH = 100
+DEFAULT_TOP = 10
+
+# OPT parsing
+# -----------
+parser = optparse.OptionParser(
+    "%prog [options]", version="%prog " + version)
+
+# add default parser
+parser = RedisCheckHelpers.add_default_parser_options(parser)
+
+parser.add_option('-w', '--warning',
+                  dest="warning", type="float",
+                  help='Warning value for the largest key. In [B]. Default : {d} [B]'.format(d=DEFAULT_WARNING)
+)
+parser.add_option('-c', '--critical',
+                  dest="critical", type="float",
+                  help='Critical value for the largest key. In [B]. Default : {d} [B]'.format(d=DEFAULT_CRITICAL)
+)
+parser.add_option('--time-budget',
+                  dest="time_budget", type="float", default=DEFAULT_TIME_BUDGET,
+                  help='Stop sampling after this delay. In [s]. Default : {d} [s]'.format(d=DEFAULT_TIME_BUDGET)
+)
+parser.add_option('--key-budget',
+                  dest="key_budget", type="int", default=DEFAULT_KEY_BUDGET,
+                  help='Stop sampling after this number of keys. Default : {d}'.format(d=DEFAULT_KEY_BUDGET)
+)
+parser.add_option('--batch',
+                  dest="batch", type="int", default=DEFAULT_BATCH,
+                  help='SCAN COUNT hint and MEMORY USAGE/TYPE pipeline size. Default : {d}'.format(d=DEFAULT_BATCH)
+)
+parser.add_option('--top',
+                  dest="top", type="int", default=DEFAULT_TOP,
+                  help='Number of largest keys reported. Default : {d}'.format(d=DEFAULT_TOP)
+)
+
+
+def key_label(key):
+    """
+    Key name as shown in the status line: truncated, repr escaped (newlines)
+    and without '|', which starts the Nagios perf data
+    """
+    return repr(key[:64]).replace('|', '\\x7c')
+
+
+def check_bigkeys(
+        redis_con,
+        warning,
+        critical,
+        time_budget=DEFAULT_TIME_BUDGET,
+        key_budget=DEFAULT_KEY_BUDGET,
+        batch=DEFAULT_BATCH,
+        top=DEFAULT_TOP,
+        debug=False
+):
+    from hurry.filesize import size, alternative
+
+    start_time = TimingHelpers.monotonic()
+    deadline = start_time + time_budget
+
+    #bounded min heap of (memory usage, key, type), the smallest is dropped first
+    largest = []
+    type_totals = {}
+    scanned = 0
+    cursor = 0
+    complete = False
+
+    while scanned < key_budget and TimingHelpers.monotonic() < deadline:
+        cursor, page = redis_con.scan(
+            cursor=cursor,
+            count=min(batch, key_budget - scanned)
+        )
+        #COUNT is only a hint, a page may hold more keys than the budget left
+        keys = page[:key_budget - scanned]
+
+        if keys:
+            pipe = redis_con.pipeline(transaction=False)
+            for key in keys:
+                pipe.execute_command('MEMORY', 'USAGE', key)
+                pipe.type(key)
+            replies = pipe.execute(raise_on_error=False)
+
+            for index, key in enumerate(keys):
+                key_size, key_type = replies[2 * index], replies[2 * index + 1]
+
+                if isinstance(key_size, Exception):
+                    raise Exception(
+                        "MEMORY USAGE failed, it needs redis >= 4.0: {m}".format(m=key_size)
+                    )
+                #the key expired or was deleted since SCAN returned it
+                if key_size is None or isinstance(key_type, Exception) or key_type == 'none':
+                    continue
+
+                total = type_totals.setdefault(key_type, [0, 0])
+                total[0] += 1
+                total[1] += key_size
+
+                if len(largest) < top:
+                    heapq.heappush(largest, (key_size, key, key_type))
+                elif key_size > largest[0][0]:
+                    heapq.heapreplace(largest, (key_size, key, key_type))
+
+            scanned += len(keys)
+
+        if cursor == 0:
+            complete = len(keys) == len(page)
+            break
+
+    elapsed_time = TimingHelpers.monotonic() - start_time
+    largest = sorted(largest, reverse=True)
+
+    if debug:
+        print("largest keys")
+        print("------------")
+        for key_size, key, key_type in largest:
+            print("{k} ({t}): {s}".format(k=key, t=key_type, s=size(key_size, alternative)))
+        print("type totals")
+        print("-----------")
+        for key_type, (count, total_size) in sorted(type_totals.items()):
+            print("{t}: {n} keys, {s}".format(t=key_type, n=count, s=size(total_size, alternative)))
+
+    largest_size = largest[0][0] if largest else 0
+
+    #Format perf data string
+    perfdata = [
+        OutputFormatHelpers.perf_data_string(
+            label="largest_key",
+            value=largest_size,
+            warn=warning,
+            crit=critical,
+            UOM='B',
+            min=0
+        ),
+        OutputFormatHelpers.perf_data_string(
+            label="scanned_keys",
+            value=scanned,
+            min=0
+        ),
+        OutputFormatHelpers.perf_data_string(
+            label="scan_duration",
+            value="{t:.3f}".format(t=elapsed_time),
+            UOM='s'
+        )
+    ]
+    for key_type, (count, total_size) in sorted(type_totals.items()):
+        perfdata.append(
+            OutputFormatHelpers.perf_data_string(
+                label="{t}_keys".format(t=key_type),
+                value=count,
+                min=0
+            )
+        )
+        perfdata.append(
+            OutputFormatHelpers.perf_data_string(
+                label="{t}_memory".format(t=key_type),
+                value=total_size,
+                UOM='B',
+                min=0
+            )
+        )
+
+    #check logic
+    status = RedisCheckEvaluators.threshold_status(largest_size, warning, critical)
+
+    #output formating
+    message = '{n} keys sampled in {t:.2f}s{p}'.format(
+        n=scanned,
+        t=elapsed_time,
+        p='' if complete else ' (budget reached)'
+    )
+    if largest:
+        message += ', largest: ' + ', '.join(
+            '{k} {s} {t}'.format(
+                k=key_label(key),
+                s=size(key_size, alternative),
+                t=key_type
+            )
+            for key_size, key, key_type in largest
+        )
+
+    return status, message, perfdata
+
+
+if __name__ == '__main__':
+    # Ok first job : parse args
+    opts, args = parser.parse_args()
+    if args:
+        parser.error("Does not accept any argument.")
+
+    debug = opts.debug
+
+    # Try to get nermic warning/critical values
+    s_warning = opts.warning or DEFAULT_WARNING
+    s_critical = opts.critical or DEFAULT_CRITICAL
+
+    try:
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_bigkeys,
+            use_snapshot=False,
+            warning=s_warning,
+            critical=s_critical,
+            time_budget=opts.time_budget,
+            key_budget=opts.key_budget,
+            batch=opts.batch,
+            top=opts.top
+        )
+
+        print(output)
+
+    except Exception as e:
+        status = "Critical"
+        if debug:
+            print(e)
+            the_type, value, tb = sys.exc_info()
+            traceback.print_tb(tb)
+        print("Error: {m}".format(m=e))
+        sys.exit(2)
+
+    finally:
+        sys.exit(NAGIOS_EXIT_CODES[status])
@@ -32,10 +32,6 @@ import optparse
 import sys
 import traceback
 import os
-import redis
-
-from hurry.filesize import size, alternative
-from decimal import Decimal, ROUND_UP
 
 # Ok try to load our directory to load the plugin utils.
 my_dir = os.path.dirname(__file__)
@@ -43,7 +39,7 @@ sys.path.insert(0, my_dir)
 
 try:
     from redis_checks import \
-        RedisCheckHelpers, OutputFormatHelpers
+        RedisCheckHelpers, RedisCheckEvaluators, NAGIOS_EXIT_CODES
 except ImportError:
     print "ERROR : this plugin needs the local redis_checks lib. Please install it"
     sys.exit(2)
@@ -53,6 +49,10 @@ except ImportError:
 DEFAULT_WARNING = 100
 DEFAULT_CRITICAL = 200
 
+#INFO sections used by this check
+#--------------------------------
+INFO_SECTIONS = ['clients']
+
 # OPT parsing
 # -----------
 parser = optparse.OptionParser(
@@ -70,17 +70,35 @@ parser.add_option('-c', '--critical',
                   help='Critical value for blocked clients. Default : {d}'.format(d=DEFAULT_CRITICAL)
 )
 
+
+def check_blocked_clients(
+        redis_con,
+        warning,
+        critical,
+        debug=False
+):
+    #get redis_info
+    redis_info = RedisCheckHelpers.get_info(
+        redis_con=redis_con,
+        sections=INFO_SECTIONS,
+        debug=debug
+    )
+
+    #check logic
+    return RedisCheckEvaluators.blocked_clients(
+        redis_info,
+        warning,
+        critical,
+        debug=debug
+    )
+
+
 if __name__ == '__main__':
     # Ok first job : parse args
     opts, args = parser.parse_args()
     if args:
         parser.error("Does not accept any argument.")
 
-    # connection parameters
-    port = opts.port
-    hostname = opts.hostname
-    password = opts.password
-    database = opts.database
     debug = opts.debug
 
     # Try to get nermic warning/critical values
@@ -88,68 +106,17 @@ if __name__ == '__main__':
     s_critical = opts.critical or DEFAULT_CRITICAL
 
     try:
-
-        #connect to redis
-        redis = redis.StrictRedis(
-            port=port,
-            password=password,
-            host=hostname,
-            db=database
-        )
-
-        #get data
-        #--------
-
-        #get redis_info
-        redis_info = RedisCheckHelpers.get_info(
-            redis_con=redis,
-            debug=debug
-        )
-
-        redis_blocked_clients = long(redis_info['blocked_clients'])
-
-        if debug:
-            print("blocked clients")
-            print("-----------")
-            print(
-                "blocked_clients: {m}".format(
-                    m=size(
-                        redis_blocked_clients,
-                        alternative
-                    )
-                )
-            )
-
-        #Format perf data string
-        con_perf_data_string = OutputFormatHelpers.perf_data_string(
-            label="blocked_clients",
-            value=redis_blocked_clients,
-            warn=s_warning,
-            crit=s_critical
-        )
-
-        #check logic
-        status = "OK"
-
-        if redis_blocked_clients >= s_warning:
-            status = "Warning"
-        if redis_blocked_clients >= s_critical:
-            status = "Critical"
-
-        #output formating
-        memory_usage_message = '{n} blocked clients'.format(
-            n=redis_blocked_clients
-        )
-
-        output = OutputFormatHelpers.check_output_string(
-            status,
-            memory_usage_message,
-            [con_perf_data_string]
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_blocked_clients,
+            warning=s_warning,
+            critical=s_critical
         )
 
         print(output)
 
     except Exception as e:
+        status = "Critical"
         if debug:
             print(e)
             the_type, value, tb = sys.exc_info()
@@ -158,8 +125,4 @@ if __name__ == '__main__':
         sys.exit(2)
 
     finally:
-        if status == "Critical":
-            sys.exit(2)
-        if status == "Warning":
-            sys.exit(1)
-        sys.exit(0)
+        sys.exit(NAGIOS_EXIT_CODES[status])
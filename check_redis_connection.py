@@ -32,8 +32,6 @@ import optparse
 import sys
 import traceback
 import os
-import redis
-from datetime import datetime
 import base64
 from math import ceil
 
@@ -43,7 +41,7 @@ sys.path.insert(0, my_dir)
 
 try:
     from redis_checks import \
-        RedisCheckHelpers, OutputFormatHelpers
+        RedisCheckHelpers, OutputFormatHelpers, TimingHelpers, NAGIOS_EXIT_CODES
 except ImportError:
     print "ERROR : this plugin needs the local redis_checks lib. Please install it"
     sys.exit(2)
@@ -52,6 +50,10 @@ except ImportError:
 #--------------
 DEFAULT_WARNING = 50
 DEFAULT_CRITICAL = 100
+DEFAULT_SAMPLES = 1
+DEFAULT_PERCENTILE = 'p95'
+PERCENTILES = ['min', 'p50', 'p95', 'p99', 'max']
+PHASES = ['connect', 'auth', 'command']
 
 # OPT parsing
 # -----------
@@ -69,102 +71,262 @@ parser.add_option('-c', '--critical',
                   dest="critical", type="int",
                   help='Critical value for connection. In [ms]. Default : {d} [ms]'.format(d=DEFAULT_CRITICAL)
 )
+parser.add_option('-n', '--samples',
+                  dest="samples", type="int", default=DEFAULT_SAMPLES,
+                  help='Number of ECHO latency samples taken over the connection. '
+                       'Above 1, thresholds apply to --percentile. Default : {d}'.format(d=DEFAULT_SAMPLES)
+)
+parser.add_option('--percentile',
+                  dest="percentile", type="choice", choices=PERCENTILES, default=DEFAULT_PERCENTILE,
+                  help='Echo delay the thresholds apply to with --samples, one of {c}. '
+                       'Default : {d}'.format(c=', '.join(PERCENTILES), d=DEFAULT_PERCENTILE)
+)
+for phase, description in [
+        ('connect', 'TCP connect'),
+        ('auth', 'AUTH and SELECT'),
+        ('command', 'first ECHO round trip')]:
+    parser.add_option('--{p}-warning'.format(p=phase),
+                      dest="{p}_warning".format(p=phase), type="float",
+                      help='Warning value for the {d} delay. In [ms]. Default : None'.format(d=description)
+    )
+    parser.add_option('--{p}-critical'.format(p=phase),
+                      dest="{p}_critical".format(p=phase), type="float",
+                      help='Critical value for the {d} delay. In [ms]. Default : None'.format(d=description)
+    )
 
-if __name__ == '__main__':
-    # Ok first job : parse args
-    opts, args = parser.parse_args()
-    if args:
-        parser.error("Does not accept any argument.")
 
-    # connection parameters
-    port = opts.port
-    hostname = opts.hostname
-    password = opts.password
-    database = opts.database
-    debug = opts.debug
+def slow_phases_result(
+        status,
+        message,
+        phase_status,
+        slow_phases
+):
+    """
+    Add the phases over their own thresholds to the check result
+    """
+    if not slow_phases:
+        return status, message
 
-    # Try to get nermic warning/critical values
-    s_warning = opts.warning or DEFAULT_WARNING
-    s_critical = opts.critical or DEFAULT_CRITICAL
+    status = OutputFormatHelpers.worst_state([status] + phase_status)
+    message = "{m}, slow {p}".format(m=message, p=', '.join(slow_phases))
 
-    try:
+    return status, message
 
-        #start timming
-        start_time = datetime.now()
 
-        #connect to redis
-        redis = redis.StrictRedis(
-            port=port,
-            password=password,
-            host=hostname,
-            db=database
-        )
+def check_connection(
+        redis_con,
+        warning,
+        critical,
+        samples=1,
+        percentile=DEFAULT_PERCENTILE,
+        phase_thresholds=None,
+        debug=False
+):
+    #create a test string
+    test_string = "May I walk on the green side of the blue moon"
+    test_string_b64 = base64.urlsafe_b64encode(test_string)
 
-        #create a test string
-        test_string = "May I walk on the green side of the blue moon"
-        test_string_b64 = base64.urlsafe_b64encode(test_string)
+    if debug:
+        print("Original string")
+        print("---------------")
+        print(test_string)
+        print("Base64 string")
+        print("-------------")
+        print(test_string_b64)
 
-        if debug:
-            print("Original string")
-            print("---------------")
-            print(test_string)
-            print("Base64 string")
-            print("-------------")
-            print(test_string_b64)
+    #open the connection then get the echo, timing each phase
+    connection, phases = RedisCheckHelpers.open_connection(redis_con)
+    try:
+        start_time = TimingHelpers.monotonic()
+        connection.send_command('ECHO', test_string_b64)
+        test_string_echo_b64 = connection.read_response()
+        phases['command'] = TimingHelpers.monotonic() - start_time
+    except:
+        connection.disconnect()
+        raise
+    finally:
+        RedisCheckHelpers.release_connection(redis_con, connection)
 
-        #get the echo
-        test_string_echo_b64 = redis.echo(test_string_b64)
-        test_string_echo = base64.urlsafe_b64decode(test_string_echo_b64)
+    test_string_echo = base64.urlsafe_b64decode(test_string_echo_b64)
 
-        if debug:
-            print("Echo Base64 string")
-            print("------------------")
-            print(test_string_echo_b64)
-            print("Echo string")
-            print("-----------")
-            print(test_string_echo)
-
-        #get request time
-        stop_time = datetime.now()
-        elapsed_time = (stop_time - start_time)
-        elapsed_time_ms = int(
-            ceil(
-                elapsed_time.microseconds * 0.001
+    #get request time
+    elapsed_time_ms = int(
+        ceil(
+            sum(phases.values()) * 1000
+        )
+    )
+
+    #per phase delays with their own thresholds
+    phase_perfdata = []
+    phase_status = []
+    slow_phases = []
+    for phase in PHASES:
+        phase_ms = phases[phase] * 1000
+        phase_warning, phase_critical = (phase_thresholds or {}).get(phase, ('', ''))
+        phase_perfdata.append(
+            OutputFormatHelpers.perf_data_string(
+                label="{p}_delay".format(p=phase),
+                value="{v:.3f}".format(v=phase_ms),
+                warn=phase_warning,
+                crit=phase_critical,
+                UOM='ms'
             )
         )
 
+        state = "OK"
+        if phase_warning != '' and phase_ms > phase_warning:
+            state = "Warning"
+        if phase_critical != '' and phase_ms > phase_critical:
+            state = "Critical"
+        if state != "OK":
+            phase_status.append(state)
+            slow_phases.append("{p} {v:.3f} ms".format(p=phase, v=phase_ms))
+
+    if debug:
+        print("Connection phases")
+        print("-----------------")
+        for phase in PHASES:
+            print("{p}: {v:.3f} ms".format(p=phase, v=phases[phase] * 1000))
+
+    if debug:
+        print("Echo Base64 string")
+        print("------------------")
+        print(test_string_echo_b64)
+        print("Echo string")
+        print("-----------")
+        print(test_string_echo)
+
+    if test_string != test_string_echo:
+        return "Critical", "Echo does not match", None
+
+    if samples <= 1:
         #Format perf data string
         con_perf_data_string = OutputFormatHelpers.perf_data_string(
             label="connection_delay",
             value=elapsed_time_ms,
-            warn=s_warning,
-            crit=s_critical,
+            warn=warning,
+            crit=critical,
             UOM='ms'
         )
 
         #check logic
-        if test_string == test_string_echo:
-            status = "OK"
-            message = "Redis connection successful"
-            if elapsed_time_ms > s_warning:
-                status = "Warning"
-                message = "Redis connection with too slow"
-            if elapsed_time_ms > s_critical:
-                status = "Critical"
-                message = "Redis connection too slow"
-        else:
+        status = "OK"
+        message = "Redis connection successful"
+        if elapsed_time_ms > warning:
+            status = "Warning"
+            message = "Redis connection with too slow"
+        if elapsed_time_ms > critical:
             status = "Critical"
-            message = "Echo does not match"
+            message = "Redis connection too slow"
+
+        status, message = slow_phases_result(status, message, phase_status, slow_phases)
+
+        return status, message, [con_perf_data_string] + phase_perfdata
+
+    #latency samples over the established connection
+    echo_delays = []
+    for i in range(samples):
+        start_time = TimingHelpers.monotonic()
+        if redis_con.echo(test_string_b64) != test_string_echo_b64:
+            return "Critical", "Echo does not match", None
+        echo_delays.append((TimingHelpers.monotonic() - start_time) * 1000)
+
+    stats = [
+        ('min', min(echo_delays)),
+        ('p50', TimingHelpers.percentile(echo_delays, 50)),
+        ('p95', TimingHelpers.percentile(echo_delays, 95)),
+        ('p99', TimingHelpers.percentile(echo_delays, 99)),
+        ('max', max(echo_delays))
+    ]
+
+    if debug:
+        print("Echo delays")
+        print("-----------")
+        for name, value in stats:
+            print("{n}: {v:.3f} ms".format(n=name, v=value))
 
-        output = OutputFormatHelpers.check_output_string(
-            status,
-            message,
-            [con_perf_data_string]
+    #Format perf data string
+    perfdata = [
+        OutputFormatHelpers.perf_data_string(
+            label="connection_delay",
+            value=elapsed_time_ms,
+            UOM='ms'
+        )
+    ] + phase_perfdata
+    for name, value in stats:
+        if name == percentile:
+            perfdata.append(
+                OutputFormatHelpers.perf_data_string(
+                    label="echo_delay_{n}".format(n=name),
+                    value="{v:.3f}".format(v=value),
+                    warn=warning,
+                    crit=critical,
+                    UOM='ms'
+                )
+            )
+        else:
+            perfdata.append(
+                OutputFormatHelpers.perf_data_string(
+                    label="echo_delay_{n}".format(n=name),
+                    value="{v:.3f}".format(v=value),
+                    UOM='ms'
+                )
+            )
+
+    #check logic
+    delay = dict(stats)[percentile]
+    status = "OK"
+    if delay > warning:
+        status = "Warning"
+    if delay > critical:
+        status = "Critical"
+
+    message = "{p} echo delay {d:.3f} ms over {n} samples".format(
+        p=percentile,
+        d=delay,
+        n=samples
+    )
+
+    status, message = slow_phases_result(status, message, phase_status, slow_phases)
+
+    return status, message, perfdata
+
+
+if __name__ == '__main__':
+    # Ok first job : parse args
+    opts, args = parser.parse_args()
+    if args:
+        parser.error("Does not accept any argument.")
+
+    debug = opts.debug
+
+    # Try to get nermic warning/critical values
+    s_warning = opts.warning or DEFAULT_WARNING
+    s_critical = opts.critical or DEFAULT_CRITICAL
+
+    phase_thresholds = {}
+    for phase in PHASES:
+        phase_thresholds[phase] = (
+            getattr(opts, "{p}_warning".format(p=phase)) or '',
+            getattr(opts, "{p}_critical".format(p=phase)) or ''
+        )
+
+    try:
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_connection,
+            use_snapshot=False,
+            warning=s_warning,
+            critical=s_critical,
+            samples=opts.samples,
+            percentile=opts.percentile,
+            phase_thresholds=phase_thresholds
         )
 
         print(output)
 
     except Exception as e:
+        status = "Critical"
         if debug:
             print(e)
             the_type, value, tb = sys.exc_info()
@@ -173,8 +335,4 @@ if __name__ == '__main__':
         sys.exit(2)
 
     finally:
-        if status == "Critical":
-            sys.exit(2)
-        if status == "Warning":
-            sys.exit(1)
-        sys.exit(0)
+        sys.exit(NAGIOS_EXIT_CODES[status])
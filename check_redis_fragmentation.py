@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015:
+#     Sébastien Pasche, sebastien.pasche@leshop.ch
+#     Benoit Chalut, benoit.chalut@leshop.ch
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+author = "Sebastien Pasche"
+maintainer = "Sebastien Pasche"
+version = "0.0.1"
+
+import optparse
+import sys
+import traceback
+import os
+
+# Ok try to load our directory to load the plugin utils.
+my_dir = os.path.dirname(__file__)
+sys.path.insert(0, my_dir)
+
+try:
+    from redis_checks import \
+        RedisCheckHelpers, RedisCheckEvaluators, OutputFormatHelpers, \
+        NAGIOS_EXIT_CODES
+except ImportError:
+    print "ERROR : this plugin needs the local redis_checks lib. Please install it"
+    sys.exit(2)
+
+#DEFAULT LIMITS
+#--------------
+DEFAULT_WARNING = 1.5
+DEFAULT_CRITICAL = 2.0
+DEFAULT_MIN_RSS = 100000000
+
+#allocator stats reported by redis >= 4.0
+ALLOCATOR_STATS = [
+    'allocator_frag_ratio',
+    'allocator_frag_bytes',
+    'allocator_rss_ratio',
+    'allocator_rss_bytes',
+    'rss_overhead_ratio',
+    'rss_overhead_bytes'
+]
+
+#INFO sections used by this check
+#--------------------------------
+INFO_SECTIONS = ['memory']
+
+# OPT parsing
+# -----------
+parser = optparse.OptionParser(
+    "%prog [options]", version="%prog " + version)
+
+# add default parser
+parser = RedisCheckHelpers.add_default_parser_options(parser)
+
+parser.add_option('-w', '--warning',
+                  dest="warning", type="float",
+                  help='Warning value for mem_fragmentation_ratio. Default : {d}'.format(d=DEFAULT_WARNING)
+)
+parser.add_option('-c', '--critical',
+                  dest="critical", type="float",
+                  help='Critical value for mem_fragmentation_ratio. Default : {d}'.format(d=DEFAULT_CRITICAL)
+)
+parser.add_option('--min-rss',
+                  dest="min_rss", type="int", default=DEFAULT_MIN_RSS,
+                  help='Fragmentation is not alerted on below this used_memory_rss. In [B]. '
+                       'Default : {d} [B]'.format(d=DEFAULT_MIN_RSS)
+)
+parser.add_option('--overhead-warning',
+                  dest="overhead_warning", type="int",
+                  help='Warning value for used_memory_rss - used_memory. In [B]. Default : None'
+)
+parser.add_option('--overhead-critical',
+                  dest="overhead_critical", type="int",
+                  help='Critical value for used_memory_rss - used_memory. In [B]. Default : None'
+)
+
+
+def check_fragmentation(
+        redis_con,
+        warning,
+        critical,
+        min_rss=DEFAULT_MIN_RSS,
+        overhead_warning='',
+        overhead_critical='',
+        debug=False
+):
+    from hurry.filesize import size, alternative
+
+    #get redis_info
+    redis_info = RedisCheckHelpers.get_info(
+        redis_con=redis_con,
+        sections=INFO_SECTIONS,
+        debug=debug
+    )
+
+    redis_memory_used = long(redis_info['used_memory'])
+    redis_memory_used_rss = long(redis_info['used_memory_rss'])
+    redis_rss_overhead = redis_memory_used_rss - redis_memory_used
+
+    if 'mem_fragmentation_ratio' in redis_info:
+        fragmentation_ratio = float(redis_info['mem_fragmentation_ratio'])
+    elif redis_memory_used:
+        fragmentation_ratio = float(redis_memory_used_rss) / redis_memory_used
+    else:
+        fragmentation_ratio = 0.0
+
+    if debug:
+        print("memory fragmentation")
+        print("--------------------")
+        print("used_memory: {m}".format(m=size(redis_memory_used, alternative)))
+        print("used_memory_rss: {m}".format(m=size(redis_memory_used_rss, alternative)))
+        print("mem_fragmentation_ratio: {r}".format(r=fragmentation_ratio))
+
+    #Format perf data string
+    perfdata = [
+        OutputFormatHelpers.perf_data_string(
+            label="mem_fragmentation_ratio",
+            value=fragmentation_ratio,
+            warn=warning,
+            crit=critical,
+            min=0
+        ),
+        OutputFormatHelpers.perf_data_string(
+            label="rss_overhead",
+            value=redis_rss_overhead,
+            warn=overhead_warning,
+            crit=overhead_critical,
+            UOM='B'
+        ),
+        OutputFormatHelpers.perf_data_string(
+            label="used_memory_rss",
+            value=redis_memory_used_rss,
+            UOM='B'
+        )
+    ]
+    for stat in ALLOCATOR_STATS:
+        if stat in redis_info:
+            perfdata.append(
+                OutputFormatHelpers.perf_data_string(
+                    label=stat,
+                    value=redis_info[stat],
+                    UOM='B' if stat.endswith('_bytes') else ''
+                )
+            )
+
+    #check logic
+    states = [
+        RedisCheckEvaluators.threshold_status(
+            redis_rss_overhead,
+            overhead_warning,
+            overhead_critical
+        )
+    ]
+
+    #tiny instances have high ratios without wasting memory
+    if redis_memory_used_rss >= min_rss:
+        states.append(
+            RedisCheckEvaluators.threshold_status(
+                fragmentation_ratio,
+                warning,
+                critical
+            )
+        )
+
+    status = OutputFormatHelpers.worst_state(states)
+
+    #output formating
+    message = '{r} fragmentation ratio, {o} RSS overhead'.format(
+        r=fragmentation_ratio,
+        o=size(max(redis_rss_overhead, 0), alternative)
+    )
+    if redis_memory_used_rss < min_rss:
+        message += ', ratio not checked below {m} RSS'.format(
+            m=size(min_rss, alternative)
+        )
+
+    return status, message, perfdata
+
+
+if __name__ == '__main__':
+    # Ok first job : parse args
+    opts, args = parser.parse_args()
+    if args:
+        parser.error("Does not accept any argument.")
+
+    debug = opts.debug
+
+    # Try to get nermic warning/critical values
+    s_warning = opts.warning or DEFAULT_WARNING
+    s_critical = opts.critical or DEFAULT_CRITICAL
+
+    try:
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_fragmentation,
+            warning=s_warning,
+            critical=s_critical,
+            min_rss=opts.min_rss,
+            overhead_warning=opts.overhead_warning or '',
+            overhead_critical=opts.overhead_critical or ''
+        )
+
+        print(output)
+
+    except Exception as e:
+        status = "Critical"
+        if debug:
+            print(e)
+            the_type, value, tb = sys.exc_info()
+            traceback.print_tb(tb)
+        print("Error: {m}".format(m=e))
+        sys.exit(2)
+
+    finally:
+        sys.exit(NAGIOS_EXIT_CODES[status])
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015:
+#     Sébastien Pasche, sebastien.pasche@leshop.ch
+#     Benoit Chalut, benoit.chalut@leshop.ch
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+author = "Sebastien Pasche"
+maintainer = "Sebastien Pasche"
+version = "0.0.1"
+
+import optparse
+import sys
+import traceback
+import os
+
+# Ok try to load our directory to load the plugin utils.
+my_dir = os.path.dirname(__file__)
+sys.path.insert(0, my_dir)
+
+try:
+    from redis_checks import \
+        RedisCheckHelpers, RedisCheckEvaluators, RedisStateStore, OutputFormatHelpers, \
+        NAGIOS_EXIT_CODES
+except ImportError:
+    print "ERROR : this plugin needs the local redis_checks lib. Please install it"
+    sys.exit(2)
+
+#DEFAULT LIMITS
+#--------------
+DEFAULT_HIT_RATIO_WARNING = 90.00
+DEFAULT_HIT_RATIO_CRITICAL = 80.00
+DEFAULT_EVICTED_WARNING = 10
+DEFAULT_EVICTED_CRITICAL = 100
+
+COUNTERS = [
+    'keyspace_hits',
+    'keyspace_misses',
+    'evicted_keys',
+    'expired_keys'
+]
+
+#INFO sections used by this check
+#--------------------------------
+INFO_SECTIONS = ['server', 'stats', 'memory']
+
+# OPT parsing
+# -----------
+parser = optparse.OptionParser(
+    "%prog [options]", version="%prog " + version)
+
+# add default parser
+parser = RedisCheckHelpers.add_default_parser_options(parser)
+
+parser.add_option('-w', '--warning',
+                  dest="warning", type="float",
+                  help='Warning value for the keyspace hit ratio, alert below. In [%]. '
+                       'Default : {d} [%]'.format(d=DEFAULT_HIT_RATIO_WARNING)
+)
+parser.add_option('-c', '--critical',
+                  dest="critical", type="float",
+                  help='Critical value for the keyspace hit ratio, alert below. In [%]. '
+                       'Default : {d} [%]'.format(d=DEFAULT_HIT_RATIO_CRITICAL)
+)
+parser.add_option('--evicted-warning',
+                  dest="evicted_warning", type="float",
+                  help='Warning value for evicted keys. In [/s]. Default : {d} [/s]'.format(d=DEFAULT_EVICTED_WARNING)
+)
+parser.add_option('--evicted-critical',
+                  dest="evicted_critical", type="float",
+                  help='Critical value for evicted keys. In [/s]. Default : {d} [/s]'.format(d=DEFAULT_EVICTED_CRITICAL)
+)
+parser.add_option('--expired-warning',
+                  dest="expired_warning", type="float",
+                  help='Warning value for expired keys. In [/s]. Default : None'
+)
+parser.add_option('--expired-critical',
+                  dest="expired_critical", type="float",
+                  help='Critical value for expired keys. In [/s]. Default : None'
+)
+
+
+def check_hit_ratio(
+        redis_con,
+        hit_ratio_thresholds,
+        evicted_thresholds,
+        expired_thresholds,
+        state_dir=RedisStateStore.STATE_DIR,
+        debug=False
+):
+    #get redis_info and current redis max memory in one round trip
+    redis_info, redis_maxmemory = RedisCheckHelpers.get_info_and_maxmemory(
+        redis_con=redis_con,
+        sections=INFO_SECTIONS,
+        check_zero=False,
+        debug=debug
+    )
+
+    #rates since the previous run
+    rates, interval = RedisStateStore.get_rates(
+        state_dir,
+        'hit_ratio',
+        RedisCheckHelpers.get_instance_key(redis_con),
+        redis_info,
+        COUNTERS,
+        timestamp=RedisCheckHelpers.get_info_timestamp(redis_con),
+        debug=debug
+    )
+
+    if rates is None:
+        return "OK", "Counters saved, rates available on next run", None
+
+    lookups = rates['keyspace_hits'] + rates['keyspace_misses']
+    hit_ratio = None
+    if lookups > 0:
+        hit_ratio = rates['keyspace_hits'] * 100 / lookups
+
+    #Format perf data string
+    perfdata = [
+        OutputFormatHelpers.perf_data_string(
+            label="evicted_keys_rate",
+            value="{v:.2f}".format(v=rates['evicted_keys']),
+            warn=evicted_thresholds[0],
+            crit=evicted_thresholds[1],
+            min=0
+        ),
+        OutputFormatHelpers.perf_data_string(
+            label="expired_keys_rate",
+            value="{v:.2f}".format(v=rates['expired_keys']),
+            warn=expired_thresholds[0],
+            crit=expired_thresholds[1],
+            min=0
+        ),
+        OutputFormatHelpers.perf_data_string(
+            label="keyspace_lookups_rate",
+            value="{v:.2f}".format(v=lookups),
+            min=0
+        )
+    ]
+    if hit_ratio is not None:
+        perfdata.insert(
+            0,
+            OutputFormatHelpers.perf_data_string(
+                label="keyspace_hit_ratio",
+                value="{v:.2f}".format(v=hit_ratio),
+                warn="{w}:".format(w=hit_ratio_thresholds[0]),
+                crit="{c}:".format(c=hit_ratio_thresholds[1]),
+                UOM='%',
+                min=0,
+                max=100
+            )
+        )
+    if redis_maxmemory:
+        perfdata.append(
+            OutputFormatHelpers.perf_data_string(
+                label="redis_memory_usage",
+                value="{v:.2f}".format(
+                    v=float(redis_info['used_memory']) * 100 / redis_maxmemory
+                ),
+                UOM='%',
+                min=0,
+                max=100
+            )
+        )
+
+    #check logic
+    states = [
+        RedisCheckEvaluators.threshold_status(
+            rates['evicted_keys'],
+            *evicted_thresholds
+        ),
+        RedisCheckEvaluators.threshold_status(
+            rates['expired_keys'],
+            *expired_thresholds
+        )
+    ]
+    if hit_ratio is not None:
+        states.append(
+            RedisCheckEvaluators.threshold_status(
+                hit_ratio,
+                *hit_ratio_thresholds,
+                below=True
+            )
+        )
+    status = OutputFormatHelpers.worst_state(states)
+
+    #output formating
+    if hit_ratio is None:
+        hit_ratio_message = 'no keyspace lookup'
+    else:
+        hit_ratio_message = '{r:.2f}% hit ratio'.format(r=hit_ratio)
+
+    message = '{h}, {ev:.2f} evicted/s, {ex:.2f} expired/s over {t:.1f}s'.format(
+        h=hit_ratio_message,
+        ev=rates['evicted_keys'],
+        ex=rates['expired_keys'],
+        t=interval
+    )
+
+    return status, message, perfdata
+
+
+if __name__ == '__main__':
+    # Ok first job : parse args
+    opts, args = parser.parse_args()
+    if args:
+        parser.error("Does not accept any argument.")
+
+    debug = opts.debug
+
+    # Try to get nermic warning/critical values
+    hit_ratio_thresholds = (
+        opts.warning or DEFAULT_HIT_RATIO_WARNING,
+        opts.critical or DEFAULT_HIT_RATIO_CRITICAL
+    )
+    evicted_thresholds = (
+        opts.evicted_warning or DEFAULT_EVICTED_WARNING,
+        opts.evicted_critical or DEFAULT_EVICTED_CRITICAL
+    )
+    expired_thresholds = (
+        opts.expired_warning or '',
+        opts.expired_critical or ''
+    )
+
+    try:
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_hit_ratio,
+            hit_ratio_thresholds=hit_ratio_thresholds,
+            evicted_thresholds=evicted_thresholds,
+            expired_thresholds=expired_thresholds,
+            state_dir=opts.state_dir
+        )
+
+        print(output)
+
+    except Exception as e:
+        status = "Critical"
+        if debug:
+            print(e)
+            the_type, value, tb = sys.exc_info()
+            traceback.print_tb(tb)
+        print("Error: {m}".format(m=e))
+        sys.exit(2)
+
+    finally:
+        sys.exit(NAGIOS_EXIT_CODES[status])
@@ -32,10 +32,6 @@ import optparse
 import sys
 import traceback
 import os
-import redis
-
-from hurry.filesize import size, alternative
-from decimal import Decimal, ROUND_UP
 
 # Ok try to load our directory to load the plugin utils.
 my_dir = os.path.dirname(__file__)
@@ -43,7 +39,9 @@ sys.path.insert(0, my_dir)
 
 try:
     from redis_checks import \
-        RedisCheckHelpers, OutputFormatHelpers
+        RedisCheckHelpers, RedisCheckEvaluators, RedisStateStore, \
+        ForecastHelpers, OutputFormatHelpers, NAGIOS_EXIT_CODES
+    from redis_history import RingBufferHistory
 except ImportError:
     print "ERROR : this plugin needs the local redis_checks lib. Please install it"
     sys.exit(2)
@@ -52,6 +50,13 @@ except ImportError:
 #--------------
 DEFAULT_WARNING = 80.00
 DEFAULT_CRITICAL = 90.00
+DEFAULT_HISTORY_WINDOW = 21600
+DEFAULT_HISTORY_SIZE = 720
+DEFAULT_MIN_SAMPLES = 3
+
+#INFO sections used by this check
+#--------------------------------
+INFO_SECTIONS = ['memory']
 
 # OPT parsing
 # -----------
@@ -69,6 +74,123 @@ parser.add_option('-c', '--critical',
                   dest="critical", type="float",
                   help='Critical value ued memory. In [%]. Default : {d} [%]'.format(d=DEFAULT_CRITICAL)
 )
+parser.add_option('--horizon-warning',
+                  dest="horizon_warning", type="float",
+                  help='Warning when maxmemory is projected to be reached within this delay. '
+                       'In [h]. Default : None'
+)
+parser.add_option('--horizon-critical',
+                  dest="horizon_critical", type="float",
+                  help='Critical when maxmemory is projected to be reached within this delay. '
+                       'In [h]. Default : None'
+)
+parser.add_option('--history-window',
+                  dest="history_window", type="int", default=DEFAULT_HISTORY_WINDOW,
+                  help='Used memory history the growth trend is fitted on. '
+                       'In [s]. Default : {d} [s]'.format(d=DEFAULT_HISTORY_WINDOW)
+)
+parser.add_option('--history-size',
+                  dest="history_size", type="int", default=DEFAULT_HISTORY_SIZE,
+                  help='Maximum number of used memory samples kept. Default : {d}'.format(d=DEFAULT_HISTORY_SIZE)
+)
+
+
+def check_maxmemory(
+        redis_con,
+        warning,
+        critical,
+        horizon_warning='',
+        horizon_critical='',
+        history_window=DEFAULT_HISTORY_WINDOW,
+        history_size=DEFAULT_HISTORY_SIZE,
+        state_dir=RedisStateStore.STATE_DIR,
+        debug=False
+):
+    #get redis_info and current redis max memory in one round trip
+    redis_info, redis_maxmemory = RedisCheckHelpers.get_info_and_maxmemory(
+        redis_con=redis_con,
+        sections=INFO_SECTIONS,
+        debug=debug
+    )
+
+    #check logic
+    status, message, perfdata = RedisCheckEvaluators.maxmemory(
+        redis_info,
+        redis_maxmemory,
+        warning,
+        critical,
+        debug=debug
+    )
+
+    #growth trend over the used memory history
+    timestamp = RedisCheckHelpers.get_info_timestamp(redis_con)
+    history = RingBufferHistory(
+        RedisStateStore.path(
+            state_dir,
+            'maxmemory_history',
+            RedisCheckHelpers.get_instance_key(redis_con),
+            extension='ring'
+        ),
+        history_size
+    )
+    with history:
+        history.append(timestamp, redis_info['used_memory'])
+        samples = [
+            (t, v) for t, v in history.last()
+            if timestamp - history_window <= t <= timestamp
+        ]
+
+    if len(samples) < DEFAULT_MIN_SAMPLES:
+        return status, message, perfdata
+
+    time_to_maxmemory, growth = ForecastHelpers.time_to_reach(
+        samples,
+        redis_maxmemory
+    )
+
+    if debug:
+        print("memory growth")
+        print("-------------")
+        print("{n} samples, growth: {g} B/s".format(n=len(samples), g=growth))
+        print("time to maxmemory: {t} s".format(t=time_to_maxmemory))
+
+    if growth is None:
+        return status, message, perfdata
+
+    perfdata.append(
+        OutputFormatHelpers.perf_data_string(
+            label="memory_growth_per_sec",
+            value="{g:.2f}".format(g=growth)
+        )
+    )
+
+    if time_to_maxmemory is None:
+        message += ', memory not growing'
+        return status, message, perfdata
+
+    perfdata.append(
+        OutputFormatHelpers.perf_data_string(
+            label="time_to_maxmemory",
+            value="{t:.0f}".format(t=time_to_maxmemory),
+            warn='{w:.0f}:'.format(w=horizon_warning * 3600) if horizon_warning != '' else '',
+            crit='{c:.0f}:'.format(c=horizon_critical * 3600) if horizon_critical != '' else '',
+            UOM='s',
+            min=0
+        )
+    )
+
+    horizon_status = RedisCheckEvaluators.threshold_status(
+        time_to_maxmemory / 3600,
+        horizon_warning,
+        horizon_critical,
+        below=True
+    )
+    status = OutputFormatHelpers.worst_state([status, horizon_status])
+
+    message += ', maxmemory reached in {h:.1f}h'.format(h=time_to_maxmemory / 3600)
+
+    return status, message, perfdata
+
 
 if __name__ == '__main__':
     # Ok first job : parse args
@@ -76,11 +198,6 @@ if __name__ == '__main__':
     if args:
         parser.error("Does not accept any argument.")
 
-    # connection parameters
-    port = opts.port
-    hostname = opts.hostname
-    password = opts.password
-    database = opts.database
     debug = opts.debug
 
     # Try to get nermic warning/critical values
@@ -88,88 +205,22 @@ if __name__ == '__main__':
     s_critical = opts.critical or DEFAULT_CRITICAL
 
     try:
-
-        #connect to redis
-        redis = redis.StrictRedis(
-            port=port,
-            password=password,
-            host=hostname,
-            db=database
-        )
-
-        #get data
-        #--------
-
-        #get redis_info
-        redis_info = RedisCheckHelpers.get_info(
-            redis_con=redis,
-            debug=debug
-        )
-
-        #get current redis max memory config
-        redis_maxmemory = RedisCheckHelpers.get_maxmemory(
-            redis_con=redis,
-            debug=debug
-        )
-
-        redis_memory_used = long(redis_info['used_memory'])
-
-        if debug:
-            print("memory used")
-            print("-----------")
-            print(
-                "used_memory: {m}".format(
-                    m=size(
-                        redis_memory_used,
-                        alternative
-                    )
-                )
-            )
-
-        #process data
-        current_redis_memory_usage = (float(redis_memory_used))/(float(redis_maxmemory))
-        current_redis_memory_usage = Decimal(current_redis_memory_usage).quantize(
-            Decimal('1.01'),
-            rounding=ROUND_UP
-        )
-
-        if debug:
-            print("current memory usage")
-            print("--------------------")
-            print("memory usage : {u}%".format(u=current_redis_memory_usage))
-
-        #Format perf data string
-        con_perf_data_string = OutputFormatHelpers.perf_data_string(
-            label="redis_memory_usage",
-            value=current_redis_memory_usage,
-            warn=s_warning,
-            crit=s_critical,
-            UOM='%'
-        )
-
-        #check logic
-        status = "OK"
-
-        if current_redis_memory_usage >= s_warning:
-            status = "Warning"
-        if current_redis_memory_usage >= s_critical:
-            status = "Critical"
-
-        #output formating
-        memory_usage_message = '{used}% of {max}'.format(
-            used=current_redis_memory_usage,
-            max=size(redis_maxmemory, alternative)
-        )
-
-        output = OutputFormatHelpers.check_output_string(
-            status,
-            memory_usage_message,
-            [con_perf_data_string]
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_maxmemory,
+            warning=s_warning,
+            critical=s_critical,
+            horizon_warning=opts.horizon_warning or '',
+            horizon_critical=opts.horizon_critical or '',
+            history_window=opts.history_window,
+            history_size=opts.history_size,
+            state_dir=opts.state_dir
         )
 
         print(output)
 
     except Exception as e:
+        status = "Critical"
         if debug:
             print(e)
             the_type, value, tb = sys.exc_info()
@@ -178,8 +229,4 @@ if __name__ == '__main__':
         sys.exit(2)
 
     finally:
-        if status == "Critical":
-            sys.exit(2)
-        if status == "Warning":
-            sys.exit(1)
-        sys.exit(0)
+        sys.exit(NAGIOS_EXIT_CODES[status])
@@ -32,10 +32,6 @@ import optparse
 import sys
 import traceback
 import os
-import redis
-
-from hurry.filesize import size, alternative
-from decimal import Decimal, ROUND_UP
 
 # Ok try to load our directory to load the plugin utils.
 my_dir = os.path.dirname(__file__)
@@ -43,7 +39,7 @@ sys.path.insert(0, my_dir)
 
 try:
     from redis_checks import \
-        RedisCheckHelpers, OutputFormatHelpers
+        RedisCheckHelpers, RedisCheckEvaluators, NAGIOS_EXIT_CODES
 except ImportError:
     print "ERROR : this plugin needs the local redis_checks lib. Please install it"
     sys.exit(2)
@@ -53,6 +49,10 @@ except ImportError:
 DEFAULT_WARNING = 50000000
 DEFAULT_CRITICAL = 50000000
 
+#INFO sections used by this check
+#--------------------------------
+INFO_SECTIONS = ['memory']
+
 # OPT parsing
 # -----------
 parser = optparse.OptionParser(
@@ -70,17 +70,37 @@ parser.add_option('-c', '--critical',
                   help='Critical value ued memory. In [B]. Default : {d} [B]'.format(d=DEFAULT_CRITICAL)
 )
 
+
+def check_memory(
+        redis_con,
+        warning,
+        critical,
+        debug=False
+):
+    #get redis_info and current redis max memory in one round trip
+    redis_info, redis_maxmemory = RedisCheckHelpers.get_info_and_maxmemory(
+        redis_con=redis_con,
+        sections=INFO_SECTIONS,
+        check_zero=False,
+        debug=debug
+    )
+
+    #check logic
+    return RedisCheckEvaluators.memory(
+        redis_info,
+        redis_maxmemory or '',
+        warning,
+        critical,
+        debug=debug
+    )
+
+
 if __name__ == '__main__':
     # Ok first job : parse args
     opts, args = parser.parse_args()
     if args:
         parser.error("Does not accept any argument.")
 
-    # connection parameters
-    port = opts.port
-    hostname = opts.hostname
-    password = opts.password
-    database = opts.database
     debug = opts.debug
 
     # Try to get nermic warning/critical values
@@ -88,94 +108,17 @@ if __name__ == '__main__':
     s_critical = opts.critical or DEFAULT_CRITICAL
 
     try:
-
-        #connect to redis
-        redis = redis.StrictRedis(
-            port=port,
-            password=password,
-            host=hostname,
-            db=database
-        )
-
-        #get data
-        #--------
-
-        #get redis_info
-        redis_info = RedisCheckHelpers.get_info(
-            redis_con=redis,
-            debug=debug
-        )
-
-        #get current redis max memory config
-        redis_maxmemory = RedisCheckHelpers.get_maxmemory(
-            redis_con=redis,
-            debug=debug
-        )
-
-        redis_memory_used = long(redis_info['used_memory'])
-        redis_memory_used_rss = long(redis_info['used_memory_rss'])
-
-        if debug:
-            print("memory used")
-            print("-----------")
-            print(
-                "used_memory: {m}".format(
-                    m=size(
-                        redis_memory_used,
-                        alternative
-                    )
-                )
-            )
-            print(
-                "used_memory_rss: {m}".format(
-                    m=size(
-                        redis_memory_used_rss,
-                        alternative
-                    )
-                )
-            )
-
-        #Format perf data string
-        perfdata = [
-            OutputFormatHelpers.perf_data_string(
-                label="used_memory",
-                value=redis_memory_used,
-                warn=s_warning,
-                crit=s_critical,
-                min=0,
-                max=redis_maxmemory,
-                UOM='B'
-            ),
-            #Format perf data string
-            OutputFormatHelpers.perf_data_string(
-                label="used_memory_rss",
-                value=redis_memory_used_rss,
-                UOM='B'
-            )
-        ]
-
-        #check logic
-        status = "OK"
-
-        if redis_memory_used >= s_warning:
-            status = "Warning"
-        if redis_memory_used >= s_critical:
-            status = "Critical"
-
-        #output formating
-        memory_usage_message = '{used} memory usage'.format(
-            used=size(redis_memory_used, alternative)
-        )
-
-        output = OutputFormatHelpers.check_output_string(
-            status,
-            memory_usage_message,
-            perfdata
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_memory,
+            warning=s_warning,
+            critical=s_critical
         )
 
         print(output)
 
     except Exception as e:
+        status = "Critical"
         if debug:
             print(e)
             the_type, value, tb = sys.exc_info()
@@ -184,8 +127,4 @@ if __name__ == '__main__':
         sys.exit(2)
 
     finally:
-        if status == "Critical":
-            sys.exit(2)
-        if status == "Warning":
-            sys.exit(1)
-        sys.exit(0)
+        sys.exit(NAGIOS_EXIT_CODES[status])
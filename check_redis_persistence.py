@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015:
+#     Sébastien Pasche, sebastien.pasche@leshop.ch
+#     Benoit Chalut, benoit.chalut@leshop.ch
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+author = "Sebastien Pasche"
+maintainer = "Sebastien Pasche"
+version = "0.0.1"
+
+import optparse
+import sys
+import traceback
+import os
+
+# Ok try to load our directory to load the plugin utils.
+my_dir = os.path.dirname(__file__)
+sys.path.insert(0, my_dir)
+
+try:
+    from redis_checks import \
+        RedisCheckHelpers, RedisCheckEvaluators, OutputFormatHelpers, \
+        NAGIOS_EXIT_CODES
+except ImportError:
+    print "ERROR : this plugin needs the local redis_checks lib. Please install it"
+    sys.exit(2)
+
+#DEFAULT LIMITS
+#--------------
+DEFAULT_WARNING = 3600
+DEFAULT_CRITICAL = 21600
+DEFAULT_FORK_WARNING = 500
+DEFAULT_FORK_CRITICAL = 1000
+DEFAULT_REWRITE_WARNING = 600
+DEFAULT_REWRITE_CRITICAL = 1800
+
+GB = 1024 ** 3
+
+#INFO sections used by this check
+#--------------------------------
+INFO_SECTIONS = ['persistence', 'stats', 'memory']
+
+# OPT parsing
+# -----------
+parser = optparse.OptionParser(
+    "%prog [options]", version="%prog " + version)
+
+# add default parser
+parser = RedisCheckHelpers.add_default_parser_options(parser)
+
+parser.add_option('-w', '--warning',
+                  dest="warning", type="float",
+                  help='Warning value for seconds since the last successful RDB save, '
+                       'when changes are pending and RDB snapshots configured. In [s]. Default : {d} [s]'.format(d=DEFAULT_WARNING)
+)
+parser.add_option('-c', '--critical',
+                  dest="critical", type="float",
+                  help='Critical value for seconds since the last successful RDB save, '
+                       'when changes are pending and RDB snapshots configured. In [s]. Default : {d} [s]'.format(d=DEFAULT_CRITICAL)
+)
+parser.add_option('--fork-warning',
+                  dest="fork_warning", type="float",
+                  help='Warning value for latest_fork_usec. In [ms]. Default : {d} [ms]'.format(d=DEFAULT_FORK_WARNING)
+)
+parser.add_option('--fork-critical',
+                  dest="fork_critical", type="float",
+                  help='Critical value for latest_fork_usec. In [ms]. Default : {d} [ms]'.format(d=DEFAULT_FORK_CRITICAL)
+)
+parser.add_option('--rewrite-warning',
+                  dest="rewrite_warning", type="float",
+                  help='Warning value for a running BGSAVE or AOF rewrite. '
+                       'In [s]. Default : {d} [s]'.format(d=DEFAULT_REWRITE_WARNING)
+)
+parser.add_option('--rewrite-critical',
+                  dest="rewrite_critical", type="float",
+                  help='Critical value for a running BGSAVE or AOF rewrite. '
+                       'In [s]. Default : {d} [s]'.format(d=DEFAULT_REWRITE_CRITICAL)
+)
+
+
+def info_time(
+        redis_info,
+        redis_con
+):
+    """
+    :return: server time redis_info was taken at from server_time_usec
+             (redis >= 6.2), else the local time it was read at
+    """
+    if 'server_time_usec' in redis_info:
+        return redis_info['server_time_usec'] / 1000000.0
+
+    return RedisCheckHelpers.get_info_timestamp(redis_con)
+
+
+def get_persistence_info(
+        redis_con,
+        debug=False
+):
+    """
+    Get INFO, CONFIG GET save and TIME in one round trip
+    :return: (redis_info, RDB snapshots configured, server time in [s]).
+             RDB snapshots count as configured when the config cannot be
+             read, the server time falls back to info_time
+    """
+    if not RedisCheckHelpers.is_connection(redis_con):
+        #agent or cache snapshot: no config, the time of its INFO
+        redis_info = RedisCheckHelpers.get_info(
+            redis_con=redis_con,
+            sections=INFO_SECTIONS,
+            debug=debug
+        )
+        return redis_info, True, info_time(redis_info, redis_con)
+
+    pipe = redis_con.pipeline(transaction=False)
+    for section in INFO_SECTIONS:
+        pipe.info(section)
+    pipe.config_get('save')
+    pipe.time()
+    replies = pipe.execute(raise_on_error=False)
+
+    redis_info = {}
+    for section_info in replies[:-2]:
+        if isinstance(section_info, Exception):
+            raise section_info
+        redis_info.update(section_info)
+
+    save, server_time = replies[-2:]
+    rdb_configured = isinstance(save, Exception) or bool(save.get('save'))
+
+    #TIME may be renamed or disabled
+    if isinstance(server_time, Exception):
+        now = info_time(redis_info, redis_con)
+    else:
+        now = server_time[0] + server_time[1] / 1000000.0
+
+    if debug:
+        from pprint import pprint
+
+        print("info")
+        print("----")
+        pprint(redis_info)
+        print("save: {s}, server time: {t}".format(s=save, t=now))
+
+    return redis_info, rdb_configured, now
+
+
+def check_persistence(
+        redis_con,
+        warning,
+        critical,
+        fork_warning=DEFAULT_FORK_WARNING,
+        fork_critical=DEFAULT_FORK_CRITICAL,
+        rewrite_warning=DEFAULT_REWRITE_WARNING,
+        rewrite_critical=DEFAULT_REWRITE_CRITICAL,
+        debug=False
+):
+    #get redis_info, whether RDB snapshots are configured and the server
+    #time the save age is computed against, not to depend on the local clock
+    redis_info, rdb_configured, now = get_persistence_info(
+        redis_con,
+        debug=debug
+    )
+
+    states = []
+    problems = []
+
+    #fork latency
+    fork_ms = redis_info.get('latest_fork_usec', 0) / 1000.0
+    used_gb = redis_info['used_memory'] / float(GB)
+    fork_status = RedisCheckEvaluators.threshold_status(fork_ms, fork_warning, fork_critical)
+    if fork_status != "OK":
+        states.append(fork_status)
+        problems.append("slow fork")
+
+    #last successful RDB save, only a concern with unsaved changes and
+    #RDB snapshots configured
+    save_age = max(
+        0,
+        int(now - redis_info.get('rdb_last_save_time', 0))
+    )
+    changes = redis_info.get('rdb_changes_since_last_save', 0)
+    if changes and rdb_configured:
+        save_status = RedisCheckEvaluators.threshold_status(save_age, warning, critical)
+        if save_status != "OK":
+            states.append(save_status)
+            problems.append("{c} changes unsaved for {a} s".format(c=changes, a=save_age))
+    elif changes and debug:
+        print("RDB snapshots disabled, last save age not checked")
+
+    if redis_info.get('rdb_last_bgsave_status', 'ok') != 'ok':
+        states.append("Critical")
+        problems.append("last bgsave failed")
+
+    #AOF, only reported once enabled
+    if redis_info.get('aof_enabled'):
+        if redis_info.get('aof_last_write_status', 'ok') != 'ok':
+            states.append("Critical")
+            problems.append("last AOF write failed")
+        if redis_info.get('aof_last_bgrewrite_status', 'ok') != 'ok':
+            states.append("Warning")
+            problems.append("last AOF rewrite failed")
+
+    #running fork children, their duration is -1 when none runs
+    rewrite_time = max(
+        redis_info.get('rdb_current_bgsave_time_sec', -1),
+        redis_info.get('aof_current_rewrite_time_sec', -1),
+        0
+    )
+    in_progress = [
+        name for name, key in [
+            ('bgsave', 'rdb_bgsave_in_progress'),
+            ('AOF rewrite', 'aof_rewrite_in_progress')
+        ] if redis_info.get(key)
+    ]
+    if in_progress:
+        rewrite_status = RedisCheckEvaluators.threshold_status(
+            rewrite_time,
+            rewrite_warning,
+            rewrite_critical
+        )
+        if rewrite_status != "OK":
+            states.append(rewrite_status)
+            problems.append("{p} running for {t} s".format(p=' and '.join(in_progress), t=rewrite_time))
+
+    if debug:
+        print("persistence")
+        print("-----------")
+        print("latest fork: {f} ms for {g:.3f} GB".format(f=fork_ms, g=used_gb))
+        print("last save: {a} s ago, {c} changes since".format(a=save_age, c=changes))
+        print("in progress: {p} for {t} s".format(p=in_progress, t=rewrite_time))
+
+    #Format perf data string
+    perfdata = [
+        OutputFormatHelpers.perf_data_string(
+            label="latest_fork",
+            value="{f:.3f}".format(f=fork_ms),
+            warn=fork_warning,
+            crit=fork_critical,
+            UOM='ms',
+            min=0
+        ),
+        OutputFormatHelpers.perf_data_string(
+            label="last_save_age",
+            value=save_age,
+            warn=warning,
+            crit=critical,
+            UOM='s',
+            min=0
+        ),
+        OutputFormatHelpers.perf_data_string(
+            label="changes_since_last_save",
+            value=changes,
+            min=0
+        ),
+        OutputFormatHelpers.perf_data_string(
+            label="fork_child_running",
+            value=rewrite_time,
+            warn=rewrite_warning,
+            crit=rewrite_critical,
+            UOM='s',
+            min=0
+        )
+    ]
+    if used_gb:
+        perfdata.append(
+            OutputFormatHelpers.perf_data_string(
+                label="fork_per_gb",
+                value="{f:.3f}".format(f=fork_ms / used_gb),
+                UOM='ms',
+                min=0
+            )
+        )
+
+    #check logic
+    status = OutputFormatHelpers.worst_state(states)
+
+    #output formating
+    message = "last fork {f:.1f} ms, last save {a} s ago".format(f=fork_ms, a=save_age)
+    if problems:
+        message += ', ' + ', '.join(problems)
+
+    return status, message, perfdata
+
+
+if __name__ == '__main__':
+    # Ok first job : parse args
+    opts, args = parser.parse_args()
+    if args:
+        parser.error("Does not accept any argument.")
+
+    debug = opts.debug
+
+    # Try to get nermic warning/critical values
+    s_warning = opts.warning if opts.warning is not None else DEFAULT_WARNING
+    s_critical = opts.critical if opts.critical is not None else DEFAULT_CRITICAL
+
+    try:
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_persistence,
+            warning=s_warning,
+            critical=s_critical,
+            fork_warning=opts.fork_warning or DEFAULT_FORK_WARNING,
+            fork_critical=opts.fork_critical or DEFAULT_FORK_CRITICAL,
+            rewrite_warning=opts.rewrite_warning or DEFAULT_REWRITE_WARNING,
+            rewrite_critical=opts.rewrite_critical or DEFAULT_REWRITE_CRITICAL
+        )
+
+        print(output)
+
+    except Exception as e:
+        status = "Critical"
+        if debug:
+            print(e)
+            the_type, value, tb = sys.exc_info()
+            traceback.print_tb(tb)
+        print("Error: {m}".format(m=e))
+        sys.exit(2)
+
+    finally:
+        sys.exit(NAGIOS_EXIT_CODES[status])
@@ -32,7 +32,6 @@ import optparse
 import sys
 import traceback
 import os
-import redis
 
 # Ok try to load our directory to load the plugin utils.
 my_dir = os.path.dirname(__file__)
@@ -40,11 +39,16 @@ sys.path.insert(0, my_dir)
 
 try:
     from redis_checks import \
-        RedisCheckHelpers, OutputFormatHelpers
+        RedisCheckHelpers, OutputFormatHelpers, TimingHelpers, NAGIOS_EXIT_CODES
 except ImportError:
     print "ERROR : this plugin needs the local redis_checks lib. Please install it"
     sys.exit(2)
 
+#DEFAULT LIMITS
+#--------------
+DEFAULT_COUNT = 1
+DEFAULT_PERCENTILE = 'p95'
+PERCENTILES = ['min', 'p50', 'p95', 'p99', 'max']
 
 # OPT parsing
 # -----------
@@ -54,6 +58,137 @@ parser = optparse.OptionParser(
 # add default parser
 parser = RedisCheckHelpers.add_default_parser_options(parser)
 
+parser.add_option('-n', '--count',
+                  dest="count", type="int", default=DEFAULT_COUNT,
+                  help='Number of PING sent in burst mode. Default : {d}, a single ping-pong'.format(d=DEFAULT_COUNT)
+)
+parser.add_option('--pipeline',
+                  dest="pipeline", default=False, action="store_true",
+                  help='Send the burst PINGs in one pipeline instead of back-to-back'
+)
+parser.add_option('-w', '--warning',
+                  dest="warning", type="float",
+                  help='Warning value for the ping delay in burst mode, --percentile back-to-back, '
+                       'average with --pipeline. In [ms]. Default : None'
+)
+parser.add_option('-c', '--critical',
+                  dest="critical", type="float",
+                  help='Critical value for the ping delay in burst mode, --percentile back-to-back, '
+                       'average with --pipeline. In [ms]. Default : None'
+)
+parser.add_option('--percentile',
+                  dest="percentile", type="choice", choices=PERCENTILES, default=DEFAULT_PERCENTILE,
+                  help='Back-to-back ping delay the thresholds apply to, one of {c}. '
+                       'Default : {d}'.format(c=', '.join(PERCENTILES), d=DEFAULT_PERCENTILE)
+)
+
+
+def check_ping(
+        redis_con,
+        count=DEFAULT_COUNT,
+        pipeline=False,
+        warning='',
+        critical='',
+        percentile=DEFAULT_PERCENTILE,
+        debug=False
+):
+    if not redis_con.ping():
+        return "Critical", "Failed to ping-pong", None
+
+    if count <= 1:
+        return "OK", "Success to ping-pong", None
+
+    #burst over the connection opened by the first ping
+    if pipeline:
+        pipe = redis_con.pipeline(transaction=False)
+        for i in range(count):
+            pipe.ping()
+
+        start_time = TimingHelpers.monotonic()
+        pongs = pipe.execute()
+        elapsed_time = TimingHelpers.monotonic() - start_time
+
+        if not all(pongs):
+            return "Critical", "Failed to ping-pong", None
+
+        stats = [
+            ('avg', elapsed_time * 1000 / count)
+        ]
+        delay_stat = 'avg'
+    else:
+        ping_delays = []
+        for i in range(count):
+            start_time = TimingHelpers.monotonic()
+            if not redis_con.ping():
+                return "Critical", "Failed to ping-pong", None
+            ping_delays.append((TimingHelpers.monotonic() - start_time) * 1000)
+        elapsed_time = sum(ping_delays) / 1000
+
+        stats = [
+            ('min', min(ping_delays)),
+            ('p50', TimingHelpers.percentile(ping_delays, 50)),
+            ('p95', TimingHelpers.percentile(ping_delays, 95)),
+            ('p99', TimingHelpers.percentile(ping_delays, 99)),
+            ('max', max(ping_delays))
+        ]
+        delay_stat = percentile
+
+    ops_per_sec = count / elapsed_time if elapsed_time > 0 else 0
+
+    if debug:
+        print("Ping burst")
+        print("----------")
+        print("{n} pings in {t:.3f} ms".format(n=count, t=elapsed_time * 1000))
+        print("ops/sec: {o:.0f}".format(o=ops_per_sec))
+        for name, value in stats:
+            print("{n}: {v:.3f} ms".format(n=name, v=value))
+
+    #Format perf data string
+    perfdata = [
+        OutputFormatHelpers.perf_data_string(
+            label="ping_ops_per_sec",
+            value="{v:.0f}".format(v=ops_per_sec),
+            min=0
+        )
+    ]
+    for name, value in stats:
+        if name == delay_stat:
+            perfdata.append(
+                OutputFormatHelpers.perf_data_string(
+                    label="ping_delay_{n}".format(n=name),
+                    value="{v:.3f}".format(v=value),
+                    warn=warning,
+                    crit=critical,
+                    UOM='ms'
+                )
+            )
+        else:
+            perfdata.append(
+                OutputFormatHelpers.perf_data_string(
+                    label="ping_delay_{n}".format(n=name),
+                    value="{v:.3f}".format(v=value),
+                    UOM='ms'
+                )
+            )
+
+    #check logic
+    delay = dict(stats)[delay_stat]
+    status = "OK"
+    if warning != '' and delay > warning:
+        status = "Warning"
+    if critical != '' and delay > critical:
+        status = "Critical"
+
+    message = "{n} {m} ping-pong at {o:.0f} ops/sec, {s} delay {d:.3f} ms".format(
+        n=count,
+        m="pipelined" if pipeline else "back-to-back",
+        o=ops_per_sec,
+        s=delay_stat,
+        d=delay
+    )
+
+    return status, message, perfdata
+
 
 if __name__ == '__main__':
     # Ok first job : parse args
@@ -61,36 +196,24 @@ if __name__ == '__main__':
     if args:
         parser.error("Does not accept any argument.")
 
-    # connection parameters
-    port = opts.port
-    hostname = opts.hostname
-    password = opts.password
-    database = opts.database
     debug = opts.debug
 
     try:
-        redis = redis.StrictRedis(
-            port=port,
-            password=password,
-            host=hostname,
-            db=database
-        )
-
-        if redis.ping():
-            status = "OK"
-            message = "Success to ping-pong"
-        else:
-            status = "Critial"
-            message = "Failed to ping-pong"
-
-        output = OutputFormatHelpers.check_output_string(
-            status,
-            message
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_ping,
+            use_snapshot=False,
+            count=opts.count,
+            pipeline=opts.pipeline,
+            warning=opts.warning or '',
+            critical=opts.critical or '',
+            percentile=opts.percentile
         )
 
         print(output)
 
     except Exception as e:
+        status = "Critical"
         if debug:
             print(e)
             the_type, value, tb = sys.exc_info()
@@ -99,8 +222,4 @@ if __name__ == '__main__':
         sys.exit(2)
 
     finally:
-        if status == "Critical":
-            sys.exit(2)
-        if status == "Warning":
-            sys.exit(1)
-        sys.exit(0)
+        sys.exit(NAGIOS_EXIT_CODES[status])
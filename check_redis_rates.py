@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015:
+#     Sébastien Pasche, sebastien.pasche@leshop.ch
+#     Benoit Chalut, benoit.chalut@leshop.ch
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+author = "Sebastien Pasche"
+maintainer = "Sebastien Pasche"
+version = "0.0.1"
+
+import optparse
+import sys
+import traceback
+import os
+
+# Ok try to load our directory to load the plugin utils.
+my_dir = os.path.dirname(__file__)
+sys.path.insert(0, my_dir)
+
+try:
+    from redis_checks import \
+        RedisCheckHelpers, RedisCheckEvaluators, RedisStateStore, OutputFormatHelpers, \
+        NAGIOS_EXIT_CODES
+except ImportError:
+    print "ERROR : this plugin needs the local redis_checks lib. Please install it"
+    sys.exit(2)
+
+#DEFAULT LIMITS
+#--------------
+DEFAULT_METRIC = 'evicted_keys'
+DEFAULT_WARNING = 10
+DEFAULT_CRITICAL = 100
+
+#cumulative INFO counters turned into rates
+COUNTERS = [
+    'total_commands_processed',
+    'total_connections_received',
+    'rejected_connections',
+    'evicted_keys',
+    'expired_keys',
+    'keyspace_hits',
+    'keyspace_misses'
+]
+
+#INFO sections used by this check
+#--------------------------------
+INFO_SECTIONS = ['server', 'stats']
+
+# OPT parsing
+# -----------
+parser = optparse.OptionParser(
+    "%prog [options]", version="%prog " + version)
+
+# add default parser
+parser = RedisCheckHelpers.add_default_parser_options(parser)
+
+parser.add_option('-m', '--metric',
+                  dest="metric", type="choice", choices=COUNTERS, default=DEFAULT_METRIC,
+                  help='Counter whose rate is checked, one of {c}. Default : {d}'.format(
+                      c=', '.join(COUNTERS),
+                      d=DEFAULT_METRIC
+                  )
+)
+parser.add_option('-w', '--warning',
+                  dest="warning", type="float",
+                  help='Warning value for the metric rate. In [/s]. Default : {d} [/s]'.format(d=DEFAULT_WARNING)
+)
+parser.add_option('-c', '--critical',
+                  dest="critical", type="float",
+                  help='Critical value for the metric rate. In [/s]. Default : {d} [/s]'.format(d=DEFAULT_CRITICAL)
+)
+
+
+def check_rates(
+        redis_con,
+        metric,
+        warning,
+        critical,
+        state_dir=RedisStateStore.STATE_DIR,
+        debug=False
+):
+    #get redis_info
+    redis_info = RedisCheckHelpers.get_info(
+        redis_con=redis_con,
+        sections=INFO_SECTIONS,
+        debug=debug
+    )
+
+    #rates since the previous run
+    rates, interval = RedisStateStore.get_rates(
+        state_dir,
+        'rates',
+        RedisCheckHelpers.get_instance_key(redis_con),
+        redis_info,
+        COUNTERS,
+        timestamp=RedisCheckHelpers.get_info_timestamp(redis_con),
+        debug=debug
+    )
+
+    if rates is None:
+        return "OK", "Counters saved, rates available on next run", None
+
+    #Format perf data string
+    perfdata = []
+    for counter in COUNTERS:
+        if counter == metric:
+            perfdata.append(
+                OutputFormatHelpers.perf_data_string(
+                    label="{c}_rate".format(c=counter),
+                    value="{v:.2f}".format(v=rates[counter]),
+                    warn=warning,
+                    crit=critical,
+                    min=0
+                )
+            )
+        else:
+            perfdata.append(
+                OutputFormatHelpers.perf_data_string(
+                    label="{c}_rate".format(c=counter),
+                    value="{v:.2f}".format(v=rates[counter]),
+                    min=0
+                )
+            )
+
+    #check logic
+    status = RedisCheckEvaluators.threshold_status(rates[metric], warning, critical)
+
+    message = '{r:.2f} {m}/s over {t:.1f}s'.format(
+        r=rates[metric],
+        m=metric,
+        t=interval
+    )
+
+    return status, message, perfdata
+
+
+if __name__ == '__main__':
+    # Ok first job : parse args
+    opts, args = parser.parse_args()
+    if args:
+        parser.error("Does not accept any argument.")
+
+    debug = opts.debug
+
+    # Try to get nermic warning/critical values
+    s_warning = opts.warning or DEFAULT_WARNING
+    s_critical = opts.critical or DEFAULT_CRITICAL
+
+    try:
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_rates,
+            metric=opts.metric,
+            warning=s_warning,
+            critical=s_critical,
+            state_dir=opts.state_dir
+        )
+
+        print(output)
+
+    except Exception as e:
+        status = "Critical"
+        if debug:
+            print(e)
+            the_type, value, tb = sys.exc_info()
+            traceback.print_tb(tb)
+        print("Error: {m}".format(m=e))
+        sys.exit(2)
+
+    finally:
+        sys.exit(NAGIOS_EXIT_CODES[status])
@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015:
+#     Sébastien Pasche, sebastien.pasche@leshop.ch
+#     Benoit Chalut, benoit.chalut@leshop.ch
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+author = "Sebastien Pasche"
+maintainer = "Sebastien Pasche"
+version = "0.0.1"
+
+import optparse
+import sys
+import traceback
+import os
+
+# Ok try to load our directory to load the plugin utils.
+my_dir = os.path.dirname(__file__)
+sys.path.insert(0, my_dir)
+
+try:
+    from redis_checks import \
+        RedisCheckHelpers, RedisCheckEvaluators, OutputFormatHelpers, \
+        NAGIOS_EXIT_CODES
+except ImportError:
+    print "ERROR : this plugin needs the local redis_checks lib. Please install it"
+    sys.exit(2)
+
+#DEFAULT LIMITS
+#--------------
+DEFAULT_WARNING = 1048576
+DEFAULT_CRITICAL = 10485760
+DEFAULT_LAG_WARNING = 10
+DEFAULT_LAG_CRITICAL = 30
+DEFAULT_LINK_DOWN_WARNING = 30
+DEFAULT_LINK_DOWN_CRITICAL = 300
+
+#replica states while a full synchronization is running
+SYNC_STATES = ['wait_bgsave', 'send_bulk']
+
+#INFO sections used by this check
+#--------------------------------
+INFO_SECTIONS = ['replication']
+
+# OPT parsing
+# -----------
+parser = optparse.OptionParser(
+    "%prog [options]", version="%prog " + version)
+
+# add default parser
+parser = RedisCheckHelpers.add_default_parser_options(parser)
+
+parser.add_option('-w', '--warning',
+                  dest="warning", type="float",
+                  help='Warning value for a replica offset lag. In [B]. Default : {d} [B]'.format(d=DEFAULT_WARNING)
+)
+parser.add_option('-c', '--critical',
+                  dest="critical", type="float",
+                  help='Critical value for a replica offset lag. In [B]. Default : {d} [B]'.format(d=DEFAULT_CRITICAL)
+)
+parser.add_option('--lag-warning',
+                  dest="lag_warning", type="float",
+                  help='Warning value for seconds since a replica last acknowledged. '
+                       'In [s]. Default : {d} [s]'.format(d=DEFAULT_LAG_WARNING)
+)
+parser.add_option('--lag-critical',
+                  dest="lag_critical", type="float",
+                  help='Critical value for seconds since a replica last acknowledged. '
+                       'In [s]. Default : {d} [s]'.format(d=DEFAULT_LAG_CRITICAL)
+)
+parser.add_option('--link-down-warning',
+                  dest="link_down_warning", type="float",
+                  help='Warning value for master_link_down_since_seconds when checking a replica. '
+                       'In [s]. Default : {d} [s]'.format(d=DEFAULT_LINK_DOWN_WARNING)
+)
+parser.add_option('--link-down-critical',
+                  dest="link_down_critical", type="float",
+                  help='Critical value for master_link_down_since_seconds when checking a replica. '
+                       'In [s]. Default : {d} [s]'.format(d=DEFAULT_LINK_DOWN_CRITICAL)
+)
+
+
+def get_replicas(
+        redis_info
+):
+    """
+    Read the replicas of a master from its INFO replication
+    :param redis_info: INFO replication
+    :return: list of dict with ip, port, state, offset and lag keys
+    """
+    replicas = []
+
+    for i in range(int(redis_info.get('connected_slaves', 0))):
+        replica = redis_info.get('slave{i}'.format(i=i))
+        if replica is None:
+            continue
+
+        #redis < 2.8 reports "ip,port,state" without offset
+        if not isinstance(replica, dict):
+            ip, port, state = (str(replica).split(',') + ['', '', ''])[:3]
+            replica = {'ip': ip, 'port': port, 'state': state}
+
+        replicas.append(replica)
+
+    return replicas
+
+
+def check_master(
+        redis_info,
+        warning,
+        critical,
+        lag_warning,
+        lag_critical,
+        debug=False
+):
+    master_offset = long(redis_info.get('master_repl_offset', 0))
+    replicas = get_replicas(redis_info)
+
+    perfdata = [
+        OutputFormatHelpers.perf_data_string(
+            label="connected_replicas",
+            value=len(replicas),
+            min=0
+        )
+    ]
+    states = []
+    problems = []
+    max_offset_lag = 0
+
+    for replica in replicas:
+        name = "{i}:{p}".format(i=replica['ip'], p=replica['port'])
+        state = replica.get('state')
+
+        if state in SYNC_STATES:
+            states.append("Warning")
+            problems.append("{n} {s}".format(n=name, s=state))
+            continue
+
+        if state != 'online':
+            states.append("Critical")
+            problems.append("{n} link {s}".format(n=name, s=state))
+            continue
+
+        if 'offset' not in replica:
+            continue
+
+        offset_lag = max(0, master_offset - long(replica['offset']))
+        max_offset_lag = max(max_offset_lag, offset_lag)
+        lag = replica.get('lag')
+
+        if debug:
+            print("{n}: offset {o}, {b} B behind, last ack {l} s ago".format(
+                n=name,
+                o=replica['offset'],
+                b=offset_lag,
+                l=lag
+            ))
+
+        perfdata.append(
+            OutputFormatHelpers.perf_data_string(
+                label="{n}_lag".format(n=name),
+                value=offset_lag,
+                warn=warning,
+                crit=critical,
+                UOM='B',
+                min=0
+            )
+        )
+
+        offset_status = RedisCheckEvaluators.threshold_status(offset_lag, warning, critical)
+        if offset_status != "OK":
+            states.append(offset_status)
+            problems.append("{n} {b} B behind".format(n=name, b=offset_lag))
+
+        #seconds since the replica last acknowledged, redis >= 2.8.20
+        if lag is None:
+            continue
+
+        perfdata.append(
+            OutputFormatHelpers.perf_data_string(
+                label="{n}_lag_seconds".format(n=name),
+                value=lag,
+                warn=lag_warning,
+                crit=lag_critical,
+                UOM='s',
+                min=0
+            )
+        )
+
+        lag_status = RedisCheckEvaluators.threshold_status(lag, lag_warning, lag_critical)
+        if lag_status != "OK":
+            states.append(lag_status)
+            problems.append("{n} last ack {l} s ago".format(n=name, l=lag))
+
+    status = OutputFormatHelpers.worst_state(states)
+
+    message = "master with {n} replicas, max lag {b} B".format(
+        n=len(replicas),
+        b=max_offset_lag
+    )
+    if problems:
+        message += ', ' + ', '.join(problems)
+
+    return status, message, perfdata
+
+
+def check_replica(
+        redis_info,
+        link_down_warning,
+        link_down_critical,
+        debug=False
+):
+    link_status = redis_info.get('master_link_status')
+    master = "{h}:{p}".format(
+        h=redis_info.get('master_host'),
+        p=redis_info.get('master_port')
+    )
+
+    if debug:
+        print("master {m} link {l}".format(m=master, l=link_status))
+
+    if link_status == 'up':
+        return "OK", "replica of {m}, link up".format(m=master), [
+            OutputFormatHelpers.perf_data_string(
+                label="master_link_down_since",
+                value=0,
+                warn=link_down_warning,
+                crit=link_down_critical,
+                UOM='s',
+                min=0
+            )
+        ]
+
+    #not reported until the replica connected to its master once
+    down_since = redis_info.get('master_link_down_since_seconds')
+    if down_since is None or down_since == -1:
+        return "Critical", "replica of {m}, link {l}, never synchronized".format(
+            m=master,
+            l=link_status
+        ), []
+
+    status = RedisCheckEvaluators.threshold_status(
+        down_since,
+        link_down_warning,
+        link_down_critical
+    )
+
+    message = "replica of {m}, link {l} since {s} s".format(
+        m=master,
+        l=link_status,
+        s=down_since
+    )
+    if redis_info.get('master_sync_in_progress'):
+        message += ', synchronizing'
+
+    return status, message, [
+        OutputFormatHelpers.perf_data_string(
+            label="master_link_down_since",
+            value=down_since,
+            warn=link_down_warning,
+            crit=link_down_critical,
+            UOM='s',
+            min=0
+        )
+    ]
+
+
+def check_replication(
+        redis_con,
+        warning,
+        critical,
+        lag_warning=DEFAULT_LAG_WARNING,
+        lag_critical=DEFAULT_LAG_CRITICAL,
+        link_down_warning=DEFAULT_LINK_DOWN_WARNING,
+        link_down_critical=DEFAULT_LINK_DOWN_CRITICAL,
+        debug=False
+):
+    #get redis_info, one INFO replication call
+    redis_info = RedisCheckHelpers.get_info(
+        redis_con=redis_con,
+        sections=INFO_SECTIONS,
+        debug=debug
+    )
+
+    #check logic
+    if redis_info.get('role') == 'master':
+        return check_master(
+            redis_info,
+            warning,
+            critical,
+            lag_warning,
+            lag_critical,
+            debug=debug
+        )
+
+    return check_replica(
+        redis_info,
+        link_down_warning,
+        link_down_critical,
+        debug=debug
+    )
+
+
+if __name__ == '__main__':
+    # Ok first job : parse args
+    opts, args = parser.parse_args()
+    if args:
+        parser.error("Does not accept any argument.")
+
+    debug = opts.debug
+
+    # Try to get nermic warning/critical values
+    s_warning = opts.warning or DEFAULT_WARNING
+    s_critical = opts.critical or DEFAULT_CRITICAL
+
+    try:
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_replication,
+            warning=s_warning,
+            critical=s_critical,
+            lag_warning=opts.lag_warning or DEFAULT_LAG_WARNING,
+            lag_critical=opts.lag_critical or DEFAULT_LAG_CRITICAL,
+            link_down_warning=opts.link_down_warning or DEFAULT_LINK_DOWN_WARNING,
+            link_down_critical=opts.link_down_critical or DEFAULT_LINK_DOWN_CRITICAL
+        )
+
+        print(output)
+
+    except Exception as e:
+        status = "Critical"
+        if debug:
+            print(e)
+            the_type, value, tb = sys.exc_info()
+            traceback.print_tb(tb)
+        print("Error: {m}".format(m=e))
+        sys.exit(2)
+
+    finally:
+        sys.exit(NAGIOS_EXIT_CODES[status])
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015:
+#     Sébastien Pasche, sebastien.pasche@leshop.ch
+#     Benoit Chalut, benoit.chalut@leshop.ch
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+author = "Sebastien Pasche"
+maintainer = "Sebastien Pasche"
+version = "0.0.1"
+
+import optparse
+import sys
+import traceback
+import os
+
+# Ok try to load our directory to load the plugin utils.
+my_dir = os.path.dirname(__file__)
+sys.path.insert(0, my_dir)
+
+try:
+    from redis_checks import \
+        RedisCheckHelpers, RedisCheckEvaluators, RedisStateStore, OutputFormatHelpers, \
+        NAGIOS_EXIT_CODES
+except ImportError:
+    print "ERROR : this plugin needs the local redis_checks lib. Please install it"
+    sys.exit(2)
+
+#DEFAULT LIMITS
+#--------------
+DEFAULT_WARNING = 10
+DEFAULT_CRITICAL = 50
+DEFAULT_FETCH = 128
+DEFAULT_FIRST_FETCH = 8
+DEFAULT_MAX_ENTRIES = 1024
+
+# OPT parsing
+# -----------
+parser = optparse.OptionParser(
+    "%prog [options]", version="%prog " + version)
+
+# add default parser
+parser = RedisCheckHelpers.add_default_parser_options(parser)
+
+parser.add_option('-w', '--warning',
+                  dest="warning", type="float",
+                  help='Warning value for new slow commands since the last run. Default : {d}'.format(d=DEFAULT_WARNING)
+)
+parser.add_option('-c', '--critical',
+                  dest="critical", type="float",
+                  help='Critical value for new slow commands since the last run. Default : {d}'.format(d=DEFAULT_CRITICAL)
+)
+parser.add_option('--duration-warning',
+                  dest="duration_warning", type="float",
+                  help='Warning value for the slowest new command. In [ms]. Default : None'
+)
+parser.add_option('--duration-critical',
+                  dest="duration_critical", type="float",
+                  help='Critical value for the slowest new command. In [ms]. Default : None'
+)
+parser.add_option('--fetch',
+                  dest="fetch", type="int", default=DEFAULT_FETCH,
+                  help='Maximum slowlog entries of the first read of a run, it starts from the '
+                       'number of new entries of the previous run. Default : {d}'.format(d=DEFAULT_FETCH)
+)
+parser.add_option('--max-entries',
+                  dest="max_entries", type="int", default=DEFAULT_MAX_ENTRIES,
+                  help='Maximum slowlog entries read in one run. Default : {d}'.format(d=DEFAULT_MAX_ENTRIES)
+)
+
+
+def get_new_entries(
+        redis_con,
+        last_id,
+        count,
+        max_entries,
+        debug=False
+):
+    """
+    Read the slowlog entries newer than last_id, newest first.
+    SLOWLOG GET has no offset, so the read doubles until it reaches last_id,
+    the end of the slowlog or max_entries.
+    :param last_id: last entry id seen by the previous run, None to read every entry
+    :param count: entries of the first read
+    :return: (run_id, new entries)
+    """
+    while True:
+        pipe = redis_con.pipeline(transaction=False)
+        pipe.info('server')
+        pipe.slowlog_get(count)
+        redis_info, entries = pipe.execute()
+
+        if debug:
+            print("read {n} slowlog entries".format(n=len(entries)))
+
+        new_entries = [
+            entry for entry in entries
+            if last_id is None or entry['id'] > last_id
+        ]
+
+        if len(new_entries) < len(entries) or len(entries) < count or count >= max_entries:
+            return redis_info.get('run_id'), new_entries
+
+        count = min(count * 2, max_entries)
+
+
+def check_slowlog(
+        redis_con,
+        warning,
+        critical,
+        duration_warning='',
+        duration_critical='',
+        fetch=DEFAULT_FETCH,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        state_dir=RedisStateStore.STATE_DIR,
+        debug=False
+):
+    instance = RedisCheckHelpers.get_instance_key(redis_con)
+    state = RedisStateStore.load(state_dir, 'slowlog', instance)
+
+    if state is None:
+        #first run: only remember where the slowlog stands
+        run_id, entries = get_new_entries(redis_con, None, 1, 1, debug=debug)
+        RedisStateStore.save(
+            state_dir,
+            'slowlog',
+            instance,
+            {
+                'run_id': run_id,
+                'last_id': entries[0]['id'] if entries else -1
+            }
+        )
+        return "OK", "Slowlog position saved, new entries checked on next run", None
+
+    #start small, from what the previous run found, not to read the same
+    #old entries again on every run
+    first_fetch = min(
+        fetch,
+        max(DEFAULT_FIRST_FETCH, state.get('new_entries', 0) + 1)
+    )
+    run_id, entries = get_new_entries(
+        redis_con,
+        state['last_id'],
+        first_fetch,
+        max_entries,
+        debug=debug
+    )
+
+    if run_id != state.get('run_id'):
+        #restarted: ids start over and every kept entry is new
+        run_id, entries = get_new_entries(
+            redis_con,
+            None,
+            fetch,
+            max_entries,
+            debug=debug
+        )
+
+    RedisStateStore.save(
+        state_dir,
+        'slowlog',
+        instance,
+        {
+            'run_id': run_id,
+            'last_id': entries[0]['id'] if entries else state['last_id'],
+            'new_entries': len(entries)
+        }
+    )
+
+    #aggregate by command name
+    commands = {}
+    for entry in entries:
+        name = entry['command'].split(' ', 1)[0].upper() or 'UNKNOWN'
+        command = commands.setdefault(name, [0, 0, 0])
+        command[0] += 1
+        command[1] = max(command[1], entry['duration'])
+        command[2] += entry['duration']
+
+    new_count = len(entries)
+    max_duration = max([entry['duration'] for entry in entries] or [0]) / 1000.0
+    total_duration = sum(entry['duration'] for entry in entries) / 1000.0
+
+    if debug:
+        print("new slow commands")
+        print("-----------------")
+        for name, (count, slowest, total) in sorted(commands.items()):
+            print("{n}: {c} calls, max {m} us, total {t} us".format(
+                n=name, c=count, m=slowest, t=total
+            ))
+
+    #Format perf data string
+    perfdata = [
+        OutputFormatHelpers.perf_data_string(
+            label="slow_commands",
+            value=new_count,
+            warn=warning,
+            crit=critical,
+            min=0
+        ),
+        OutputFormatHelpers.perf_data_string(
+            label="slow_max_duration",
+            value="{d:.3f}".format(d=max_duration),
+            warn=duration_warning,
+            crit=duration_critical,
+            UOM='ms',
+            min=0
+        ),
+        OutputFormatHelpers.perf_data_string(
+            label="slow_total_duration",
+            value="{d:.3f}".format(d=total_duration),
+            UOM='ms',
+            min=0
+        )
+    ]
+    for name, (count, slowest, total) in sorted(commands.items()):
+        perfdata.append(
+            OutputFormatHelpers.perf_data_string(
+                label="slow_{n}_count".format(n=name.lower()),
+                value=count,
+                min=0
+            )
+        )
+        perfdata.append(
+            OutputFormatHelpers.perf_data_string(
+                label="slow_{n}_max_duration".format(n=name.lower()),
+                value="{d:.3f}".format(d=slowest / 1000.0),
+                UOM='ms',
+                min=0
+            )
+        )
+
+    #check logic
+    status = OutputFormatHelpers.worst_state([
+        RedisCheckEvaluators.threshold_status(new_count, warning, critical),
+        RedisCheckEvaluators.threshold_status(max_duration, duration_warning, duration_critical)
+    ])
+
+    #output formating
+    message = '{n} new slow commands'.format(n=new_count)
+    if commands:
+        message += ', ' + ', '.join(
+            '{n} x{c} max {m:.3f} ms'.format(n=name, c=count, m=slowest / 1000.0)
+            for name, (count, slowest, total) in sorted(
+                commands.items(),
+                key=lambda item: item[1][2],
+                reverse=True
+            )
+        )
+    if new_count >= max_entries:
+        message += ' (--max-entries reached)'
+
+    return status, message, perfdata
+
+
+if __name__ == '__main__':
+    # Ok first job : parse args
+    opts, args = parser.parse_args()
+    if args:
+        parser.error("Does not accept any argument.")
+
+    debug = opts.debug
+
+    # Try to get nermic warning/critical values
+    s_warning = opts.warning or DEFAULT_WARNING
+    s_critical = opts.critical or DEFAULT_CRITICAL
+
+    try:
+        status, output = RedisCheckHelpers.run_check(
+            opts,
+            check_slowlog,
+            use_snapshot=False,
+            warning=s_warning,
+            critical=s_critical,
+            duration_warning=opts.duration_warning or '',
+            duration_critical=opts.duration_critical or '',
+            fetch=opts.fetch,
+            max_entries=opts.max_entries,
+            state_dir=opts.state_dir
+        )
+
+        print(output)
+
+    except Exception as e:
+        status = "Critical"
+        if debug:
+            print(e)
+            the_type, value, tb = sys.exc_info()
+            traceback.print_tb(tb)
+        print("Error: {m}".format(m=e))
+        sys.exit(2)
+
+    finally:
+        sys.exit(NAGIOS_EXIT_CODES[status])
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015:
+#     Sébastien Pasche, sebastien.pasche@leshop.ch
+#     Benoit Chalut, benoit.chalut@leshop.ch
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+author = "Sebastien Pasche"
+maintainer = "Sebastien Pasche"
+version = "0.0.1"
+
+import optparse
+import sys
+import traceback
+import os
+import json
+import signal
+import threading
+import time
+import SocketServer
+
+# Ok try to load our directory to load the plugin utils.
+my_dir = os.path.dirname(__file__)
+sys.path.insert(0, my_dir)
+
+try:
+    from redis_checks import \
+        RedisCheckHelpers
+except ImportError:
+    print "ERROR : this agent needs the local redis_checks lib. Please install it"
+    sys.exit(2)
+
+#DEFAULTS
+#--------
+DEFAULT_SOCKET = '/tmp/check_redis_agent.sock'
+DEFAULT_INTERVAL = 10
+DEFAULT_TTL = 30
+
+# OPT parsing
+# -----------
+parser = optparse.OptionParser(
+    "%prog [options]", version="%prog " + version)
+
+# add default parser
+parser = RedisCheckHelpers.add_default_parser_options(parser)
+
+parser.add_option('-i', '--interval',
+                  dest="interval", type="float", default=DEFAULT_INTERVAL,
+                  help='Seconds between two INFO refresh of an instance. Default : {d} [s]'.format(d=DEFAULT_INTERVAL)
+)
+parser.add_option('-t', '--ttl',
+                  dest="ttl", type="float", default=DEFAULT_TTL,
+                  help='Maximum age of a snapshot served to checks. Default : {d} [s]'.format(d=DEFAULT_TTL)
+)
+
+
+class InstancePoller(threading.Thread):
+    """
+    Keep one persistent connection to a redis instance and refresh its
+    INFO and config snapshot every interval seconds
+    """
+
+    def __init__(
+            self,
+            redis_con,
+            interval,
+            debug=False
+    ):
+        super(InstancePoller, self).__init__()
+        self.daemon = True
+        self.redis_con = redis_con
+        self.interval = interval
+        self.debug = debug
+        self.snapshot = None
+        self.updated = None
+        self.error = "No snapshot yet"
+        self.stopped = threading.Event()
+
+    def refresh(self):
+        self.snapshot = RedisCheckHelpers.fetch_snapshot(self.redis_con)
+        self.updated = time.time()
+        self.error = None
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                self.error = "{m}".format(m=e)
+                if self.debug:
+                    print("refresh failed: {m}".format(m=e))
+            self.stopped.wait(self.interval)
+
+    def get_snapshot(
+            self,
+            ttl
+    ):
+        if self.snapshot is None or time.time() - self.updated > ttl:
+            raise Exception(
+                "No fresh snapshot: {m}".format(m=self.error or "snapshot too old")
+            )
+
+        reply = dict(self.snapshot)
+        reply['age'] = time.time() - self.updated
+
+        return reply
+
+
+class AgentRequestHandler(SocketServer.StreamRequestHandler):
+    """
+    Answer one JSON request line {"instance": "host:port/db"} with the
+    instance snapshot or {"error": "..."}
+    """
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            poller = self.server.pollers.get(request['instance'])
+            if poller is None:
+                raise Exception(
+                    "Instance {i} is not monitored by the agent".format(
+                        i=request['instance']
+                    )
+                )
+            reply = poller.get_snapshot(self.server.ttl)
+        except Exception as e:
+            reply = {'error': "{m}".format(m=e)}
+
+        self.wfile.write(json.dumps(reply) + '\n')
+
+
+class AgentServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(
+            self,
+            socket_path,
+            pollers,
+            ttl
+    ):
+        SocketServer.UnixStreamServer.__init__(
+            self,
+            socket_path,
+            AgentRequestHandler
+        )
+        self.pollers = pollers
+        self.ttl = ttl
+
+
+def shutdown(signum, frame):
+    raise SystemExit(0)
+
+
+if __name__ == '__main__':
+    # Ok first job : parse args
+    opts, args = parser.parse_args()
+    if args:
+        parser.error("Does not accept any argument.")
+
+    debug = opts.debug
+    socket_path = opts.agent_socket or DEFAULT_SOCKET
+
+    if opts.hosts:
+        targets = RedisCheckHelpers.parse_targets(opts.hosts, opts.port)
+    else:
+        targets = [(opts.hostname, opts.port)]
+
+    server = None
+    try:
+        pollers = {}
+        for hostname, port in targets:
+            poller = InstancePoller(
+                RedisCheckHelpers.get_connection(
+                    hostname=hostname,
+                    port=port,
+                    password=opts.password,
+                    database=opts.database,
+                    **RedisCheckHelpers.connection_args(opts, deadline=False)
+                ),
+                opts.interval,
+                debug=debug
+            )
+            pollers[RedisCheckHelpers.instance_key(hostname, port, opts.database)] = poller
+            poller.start()
+
+        #a socket left by a killed agent would prevent the bind
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        server = AgentServer(socket_path, pollers, opts.ttl)
+
+        signal.signal(signal.SIGTERM, shutdown)
+
+        if debug:
+            print("serving {n} instances on {s}".format(n=len(pollers), s=socket_path))
+
+        server.serve_forever()
+
+    except (KeyboardInterrupt, SystemExit):
+        pass
+
+    except Exception as e:
+        if debug:
+            print(e)
+            the_type, value, tb = sys.exc_info()
+            traceback.print_tb(tb)
+        print("Error: {m}".format(m=e))
+        sys.exit(2)
+
+    finally:
+        if server is not None:
+            server.server_close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
@@ -29,79 +29,2846 @@ author = "Sebastien Pasche"
 maintainer = "Sebastien Pasche"
 version = "0.0.1"
 
-import redis
-from hurry.filesize import size, alternative
-from pprint import pprint
+import os
+import sys
+import time
+
+#when redis_checks started to load, for --timings
+IMPORT_START = time.time()
+
+import math
+import socket
+import threading
+
+#redis, hurry.filesize, pprint and decimal are imported where used: a
+#check run with --resp does not load redis-py at all
+
+NAGIOS_STATES = ['OK', 'Warning', 'Critical', 'Unknown']
+NAGIOS_EXIT_CODES = {
+    'OK': 0,
+    'Warning': 1,
+    'Critical': 2,
+    'Unknown': 3
+}
 
 class RedisCheckHelpers(object):
     @classmethod
-    def add_default_parser_options(
+    def add_default_parser_options(
+            cls,
+            parser
+    ):
+        parser.add_option('-H', '--hostname',type="str", default="localhost",
+                          dest="hostname",
+                          help='Hostname to connect to. Default : locahost')
+        parser.add_option('-p', '--port',
+                          dest="port", type="int", default=6379,
+                          help='Redis port to connect to. Default : 6379')
+        parser.add_option('-P', '--password',
+                          dest="password", type="str", default=None,
+                          help='Redis password used for connection. Default : None')
+        parser.add_option('--db',
+                          dest="database", type="int", default=0,
+                          help='Redis database to connect to. Default : 0')
+        parser.add_option('--socket',
+                          dest="socket", type="str", default=None,
+                          help='Unix socket to connect to instead of -H/--port. Default : None')
+        parser.add_option('--ssl',
+                          dest="ssl", default=False, action="store_true",
+                          help='Connect with TLS. Default : False')
+        parser.add_option('--ssl-keyfile',
+                          dest="ssl_keyfile", type="str", default=None,
+                          help='TLS client private key. Default : None')
+        parser.add_option('--ssl-certfile',
+                          dest="ssl_certfile", type="str", default=None,
+                          help='TLS client certificate. Default : None')
+        parser.add_option('--ssl-ca-certs',
+                          dest="ssl_ca_certs", type="str", default=None,
+                          help='CA certificates the server certificate is verified with. Default : None')
+        parser.add_option('--ssl-cert-reqs',
+                          dest="ssl_cert_reqs", type="choice",
+                          choices=['none', 'optional', 'required'], default='required',
+                          help='Server certificate verification, one of none, optional, '
+                               'required. Default : required')
+        parser.add_option('--timeout',
+                          dest="timeout", type="float", default=RedisDeadline.TIMEOUT,
+                          help='Deadline of the whole check, shared by connect, AUTH and every '
+                               'command. 0 to disable. Default : {d} [s]'.format(d=RedisDeadline.TIMEOUT))
+        parser.add_option('--timeout-state',
+                          dest="timeout_state", type="choice", choices=['Critical', 'Unknown'],
+                          default='Critical',
+                          help='State returned when the deadline expires, Critical or Unknown. '
+                               'Default : Critical')
+        parser.add_option('--breaker-failures',
+                          dest="breaker_failures", type="int", default=RedisCircuitBreaker.FAILURES,
+                          help='Consecutive connection failures after which checks of an instance '
+                               'fail fast for --breaker-backoff. 0 to disable. '
+                               'Default : {d}'.format(d=RedisCircuitBreaker.FAILURES))
+        parser.add_option('--breaker-backoff',
+                          dest="breaker_backoff", type="float", default=RedisCircuitBreaker.BACKOFF,
+                          help='Seconds checks fail fast before one probes the instance again. '
+                               'Default : {d} [s]'.format(d=RedisCircuitBreaker.BACKOFF))
+        parser.add_option('--hosts',
+                          dest="hosts", type="str", default=None,
+                          help='Comma separated list of host[:port] targets checked '
+                               'concurrently instead of -H. Default : None')
+        parser.add_option('--workers',
+                          dest="workers", type="int", default=10,
+                          help='Maximum number of targets checked in parallel with --hosts. Default : 10')
+        parser.add_option('--cluster',
+                          dest="cluster", default=False, action="store_true",
+                          help='Use -H/--port, or the --hosts targets, as seed nodes of a redis '
+                               'cluster and run the check against every node. Default : False')
+        parser.add_option('--sentinels',
+                          dest="sentinels", type="str", default=None,
+                          help='Comma separated list of sentinel host[:port] resolving the '
+                               'instance to check instead of -H. Default : None')
+        parser.add_option('--sentinel-service',
+                          dest="sentinel_service", type="str", default='mymaster',
+                          help='Sentinel service (master name) to resolve. Default : mymaster')
+        parser.add_option('--sentinel-role',
+                          dest="sentinel_role", type="choice", choices=['master', 'replica'],
+                          default='master',
+                          help='Check the current master or every replica of the sentinel '
+                               'service. Default : master')
+        parser.add_option('--sentinel-ttl',
+                          dest="sentinel_ttl", type="float", default=RedisSentinelHelpers.TTL,
+                          help='Seconds a sentinel resolution is reused, kept in --state-dir. '
+                               'Default : {d} [s]'.format(d=RedisSentinelHelpers.TTL))
+        parser.add_option('--agent-socket',
+                          dest="agent_socket", type="str", default=None,
+                          help='Unix socket of a running redis_check_agent.py. INFO based checks '
+                               'read its cached snapshot and connect to redis only if the agent '
+                               'cannot answer. Default : None')
+        parser.add_option('--cache-dir',
+                          dest="cache_dir", type="str", default=None,
+                          help='Directory of the INFO snapshot cache shared by INFO based checks '
+                               'of the same instance. Default : None, no cache')
+        parser.add_option('--cache-max-age',
+                          dest="cache_max_age", type="float", default=RedisSnapshotCache.MAX_AGE,
+                          help='Maximum age of a cached INFO snapshot. '
+                               'Default : {d} [s]'.format(d=RedisSnapshotCache.MAX_AGE))
+        parser.add_option('--state-dir',
+                          dest="state_dir", type="str", default=RedisStateStore.STATE_DIR,
+                          help='Directory where checks keep state between runs. '
+                               'Default : {d}'.format(d=RedisStateStore.STATE_DIR))
+        parser.add_option('--timings',
+                          dest="timings", default=False, action="store_true",
+                          help='Add the time spent in each phase of the check as perf data, '
+                               'print them with --debug')
+        parser.add_option('--resp',
+                          dest="resp", default=False, action="store_true",
+                          help='Use the built-in RESP client instead of redis-py, starts faster. '
+                               'Only for checks sending PING, ECHO, INFO, CONFIG GET and TIME, '
+                               'ignored with --ssl')
+        parser.add_option('--debug',
+                          dest="debug", default=False, action="store_true",
+                          help='Enable debug')
+
+        return parser
+
+    @classmethod
+    def get_connection(
+            cls,
+            hostname='localhost',
+            port=6379,
+            password=None,
+            database=0,
+            **connection_args
+    ):
+        """
+        :param connection_args: extra redis.StrictRedis arguments and deadline, see connection_args
+        """
+        import redis
+
+        instrumented = 'deadline' in connection_args
+        deadline = connection_args.pop('deadline', None)
+
+        redis_con = redis.StrictRedis(
+            port=port,
+            password=password,
+            host=hostname,
+            db=database,
+            **connection_args
+        )
+
+        if instrumented:
+            RedisDeadline.apply(redis_con, deadline)
+
+        return redis_con
+
+    @classmethod
+    def connection_args(
+            cls,
+            opts,
+            deadline=True
+    ):
+        """
+        Unix socket, TLS and timeout get_connection arguments from the parsed options
+        :param opts: parsed options from add_default_parser_options
+        :param deadline: bound the connections by the --timeout deadline of
+                         the check run and time them for --timings, otherwise
+                         use --timeout as plain socket timeouts
+        :return: dict of get_connection arguments
+        """
+        connection_args = {}
+
+        if opts.timeout and deadline:
+            connection_args['deadline'] = RedisDeadline.start(opts.timeout)
+        elif opts.timings and deadline:
+            connection_args['deadline'] = None
+        elif opts.timeout:
+            connection_args.update(
+                socket_connect_timeout=opts.timeout,
+                socket_timeout=opts.timeout
+            )
+
+        if opts.socket:
+            connection_args['unix_socket_path'] = opts.socket
+
+        if opts.ssl:
+            connection_args.update(
+                ssl=True,
+                ssl_keyfile=opts.ssl_keyfile,
+                ssl_certfile=opts.ssl_certfile,
+                ssl_ca_certs=opts.ssl_ca_certs,
+                ssl_cert_reqs=opts.ssl_cert_reqs
+            )
+
+        return connection_args
+
+    @classmethod
+    def connect(
+            cls,
+            opts,
+            hostname,
+            port,
+            use_snapshot=True
+    ):
+        """
+        Get what a check reads its data from: the check agent snapshot when
+        --agent-socket is given and the agent has a fresh one, the on-disk
+        cache snapshot when --cache-dir is given, a redis connection otherwise
+        :param opts: parsed options from add_default_parser_options
+        :return: RedisSnapshot, RespClient or redis.StrictRedis
+        """
+        if use_snapshot and opts.agent_socket:
+            try:
+                return RedisAgentHelpers.get_snapshot(
+                    opts.agent_socket,
+                    hostname,
+                    port,
+                    opts.database
+                )
+            except Exception as e:
+                if opts.debug:
+                    print("agent snapshot unavailable, fallback to redis: {m}".format(m=e))
+
+        if opts.resp and not opts.ssl:
+            redis_con = RespClient(
+                host=hostname,
+                port=port,
+                password=opts.password,
+                db=opts.database,
+                **cls.connection_args(opts)
+            )
+        else:
+            redis_con = cls.get_connection(
+                hostname=hostname,
+                port=port,
+                password=opts.password,
+                database=opts.database,
+                **cls.connection_args(opts)
+            )
+
+        if use_snapshot and opts.cache_dir:
+            return RedisSnapshotCache.get_snapshot(
+                opts.cache_dir,
+                opts.cache_max_age,
+                redis_con,
+                debug=opts.debug
+            )
+
+        return redis_con
+
+    @classmethod
+    def open_connection(
+            cls,
+            redis_con
+    ):
+        """
+        Open a new connection of the redis_con pool and time its phases
+        :param redis_con: redis connection
+        :type redis_con: redis.StrictRedis or RespClient
+        :return: (connection, {'connect': seconds, 'auth': seconds}), the
+                 connection has to be released with release_connection
+        """
+        if isinstance(redis_con, RespClient):
+            return cls._open_resp_connection(redis_con)
+
+        import redis
+
+        connection = redis_con.connection_pool.get_connection('ECHO')
+        phases = {}
+
+        try:
+            #time a fresh connection, not one left open by a previous command
+            connection.disconnect()
+
+            #TCP (or unix socket) connect
+            start_time = TimingHelpers.monotonic()
+            try:
+                connection._sock = connection._connect()
+            except socket.error as e:
+                raise redis.ConnectionError(connection._error_message(e))
+            phases['connect'] = TimingHelpers.monotonic() - start_time
+
+            #AUTH and SELECT
+            start_time = TimingHelpers.monotonic()
+            connection.on_connect()
+            phases['auth'] = TimingHelpers.monotonic() - start_time
+        except:
+            connection.disconnect()
+            redis_con.connection_pool.release(connection)
+            raise
+
+        return connection, phases
+
+    @classmethod
+    def _open_resp_connection(
+            cls,
+            redis_con
+    ):
+        """
+        open_connection of a RespClient, its only connection
+        """
+        phases = {}
+
+        try:
+            redis_con.disconnect()
+
+            start_time = TimingHelpers.monotonic()
+            redis_con._connect()
+            phases['connect'] = TimingHelpers.monotonic() - start_time
+
+            start_time = TimingHelpers.monotonic()
+            redis_con.on_connect()
+            phases['auth'] = TimingHelpers.monotonic() - start_time
+        except:
+            redis_con.disconnect()
+            raise
+
+        return redis_con, phases
+
+    @classmethod
+    def release_connection(
+            cls,
+            redis_con,
+            connection
+    ):
+        """
+        Give back a connection from open_connection
+        """
+        if not isinstance(redis_con, RespClient):
+            redis_con.connection_pool.release(connection)
+
+    @classmethod
+    def fetch_snapshot(
+            cls,
+            redis_con
+    ):
+        """
+        Get INFO all, maxmemory and maxclients in one round trip
+        :param redis_con: redis connection
+        :type redis_con: redis.StrictRedis
+        :return: dict with info, maxmemory and maxclients keys
+        """
+        pipe = redis_con.pipeline(transaction=False)
+        pipe.info('all')
+        pipe.config_get('maxmemory')
+        pipe.config_get('maxclients')
+        info, maxmemory, maxclients = pipe.execute(raise_on_error=False)
+
+        if isinstance(info, Exception):
+            raise info
+
+        #INFO memory reports maxmemory since redis 3.2
+        if 'maxmemory' in info:
+            maxmemory = long(info['maxmemory'])
+        elif isinstance(maxmemory, Exception):
+            maxmemory = 0
+        else:
+            maxmemory = long(maxmemory['maxmemory'])
+
+        if isinstance(maxclients, Exception):
+            maxclients = 0
+        else:
+            maxclients = long(maxclients['maxclients'])
+
+        return {
+            'info': info,
+            'maxmemory': maxmemory,
+            'maxclients': maxclients
+        }
+
+    @classmethod
+    def instance_key(
+            cls,
+            hostname,
+            port,
+            database=0
+    ):
+        return "{h}:{p}/{d}".format(h=hostname, p=port, d=database)
+
+    @classmethod
+    def get_instance_key(
+            cls,
+            redis_con
+    ):
+        """
+        Identify the instance a check reads from, to key its saved state
+        :param redis_con: redis connection or snapshot
+        :return: "hostname:port/database"
+        """
+        if isinstance(redis_con, (RedisSnapshot, RespClient)):
+            return redis_con.instance
+
+        kwargs = redis_con.connection_pool.connection_kwargs
+
+        return cls.instance_key(
+            kwargs.get('host', kwargs.get('path')),
+            kwargs.get('port', ''),
+            kwargs.get('db', 0)
+        )
+
+    @classmethod
+    def is_connection(
+            cls,
+            redis_con
+    ):
+        """
+        :return: redis_con is a redis-py or built-in RESP client connection
+        """
+        if isinstance(redis_con, RespClient):
+            return True
+
+        #redis_con cannot be a redis-py connection when it is not loaded
+        redis = sys.modules.get('redis')
+
+        return redis is not None and isinstance(redis_con, redis.StrictRedis)
+
+    @classmethod
+    def connection_errors(cls):
+        """
+        :return: tuple of the exceptions raised when an instance cannot be
+                 reached, with the redis-py ones once it is loaded
+        """
+        errors = (RespConnectionError, RedisDeadlineError)
+
+        redis = sys.modules.get('redis')
+        if redis is not None:
+            errors += (redis.ConnectionError, redis.TimeoutError)
+
+        return errors
+
+    @classmethod
+    def get_info_timestamp(
+            cls,
+            redis_con
+    ):
+        """
+        :return: when the INFO read from redis_con was taken, snapshots may be older than now
+        """
+        if isinstance(redis_con, RedisSnapshot):
+            return time.time() - redis_con.age
+
+        return time.time()
+
+    @classmethod
+    def parse_targets(
+            cls,
+            hosts,
+            default_port=6379
+    ):
+        """
+        Parse a comma separated list of host[:port] targets
+        :param hosts: targets list, ex: "redis1:6379,redis2,[::1]:6380"
+        :type hosts: str
+        :param default_port: port used when a target has none
+        :return: list of (hostname, port) tuples
+        """
+        targets = []
+
+        for target in hosts.split(','):
+            target = target.strip()
+            if not target:
+                continue
+
+            if target.startswith('['):
+                hostname, _, port = target[1:].partition(']')
+                port = port.lstrip(':')
+            elif target.count(':') == 1:
+                hostname, port = target.split(':')
+            else:
+                hostname, port = target, ''
+
+            targets.append((hostname, int(port) if port else default_port))
+
+        if not targets:
+            raise Exception("No target to check in {h}".format(h=hosts))
+
+        return targets
+
+    @classmethod
+    def run_check(
+            cls,
+            opts,
+            check,
+            use_snapshot=True,
+            **check_args
+    ):
+        """
+        Run a check against -H/--port or, with --hosts, against every target
+        :param opts: parsed options from add_default_parser_options
+        :param check: function(redis_con, debug=False, **check_args)
+                      returning a (status, message, perfdata) tuple
+        :param use_snapshot: the check only reads INFO/config and can be served
+                             by the check agent or the on-disk cache snapshot
+        :return: (status, check output string)
+        """
+        status, output = cls._run_check(
+            opts,
+            check,
+            use_snapshot=use_snapshot,
+            **check_args
+        )
+
+        return status, cls.timings_output(opts, output)
+
+    @classmethod
+    def timings_output(
+            cls,
+            opts,
+            output
+    ):
+        """
+        Add the --timings perf data to a check output
+        :return: check output string
+        """
+        if not opts.timings:
+            return output
+
+        if opts.debug:
+            TimingHelpers.print_phases()
+
+        return OutputFormatHelpers.add_perf_data(
+            output,
+            TimingHelpers.phases_perf_data()
+        )
+
+    @classmethod
+    def error_output(
+            cls,
+            opts,
+            error
+    ):
+        """
+        Check result of a run stopped by its deadline or circuit breaker
+        :param error: RedisDeadlineError or RedisCircuitOpenError
+        :return: (status, check output string)
+        """
+        status = opts.timeout_state if isinstance(error, RedisDeadlineError) else "Critical"
+
+        return status, OutputFormatHelpers.check_output_string(
+            status,
+            "{m}".format(m=error)
+        )
+
+    @classmethod
+    def _run_check(
+            cls,
+            opts,
+            check,
+            use_snapshot=True,
+            **check_args
+    ):
+        """
+        Run the check through sentinel, cluster, --hosts or against -H/--port
+        :return: (status, check output string)
+        """
+        try:
+            if opts.sentinels:
+                return cls.run_sentinel_check(
+                    opts,
+                    check,
+                    use_snapshot=use_snapshot,
+                    **check_args
+                )
+
+            if opts.cluster:
+                return cls.run_cluster_check(
+                    opts,
+                    check,
+                    use_snapshot=use_snapshot,
+                    **check_args
+                )
+
+            if opts.hosts:
+                results = cls.fan_out(
+                    cls.parse_targets(opts.hosts, opts.port),
+                    check,
+                    opts,
+                    use_snapshot=use_snapshot,
+                    **check_args
+                )
+                return OutputFormatHelpers.multi_host_output(results)
+
+            status, message, perfdata = cls.check_target(
+                opts,
+                opts.hostname,
+                opts.port,
+                check,
+                use_snapshot=use_snapshot,
+                **check_args
+            )
+
+            return status, OutputFormatHelpers.check_output_string(
+                status,
+                message,
+                perfdata
+            )
+        except (RedisDeadlineError, RedisCircuitOpenError) as e:
+            return cls.error_output(opts, e)
+
+    @classmethod
+    def run_sentinel_check(
+            cls,
+            opts,
+            check,
+            use_snapshot=True,
+            **check_args
+    ):
+        """
+        Run the check against the current master, or every replica, of the
+        --sentinel-service. A cached resolution failing to connect is
+        resolved again once, the node may have changed since.
+        :return: (status, check output string)
+        """
+        sentinels = cls.parse_targets(opts.sentinels, 26379)
+
+        for refresh in (False, True):
+            resolution = RedisSentinelHelpers.resolve(
+                sentinels,
+                opts.sentinel_service,
+                opts.state_dir,
+                ttl=opts.sentinel_ttl,
+                refresh=refresh,
+                debug=opts.debug
+            )
+
+            if opts.sentinel_role == 'replica':
+                if not resolution['replicas']:
+                    raise Exception("No replica of {s} known by the sentinels".format(
+                        s=opts.sentinel_service
+                    ))
+
+                results = cls.fan_out(
+                    resolution['replicas'],
+                    check,
+                    opts,
+                    use_snapshot=use_snapshot,
+                    **check_args
+                )
+                failed = [
+                    target for target, (status, message, perfdata) in results
+                    if status == "Critical"
+                ]
+                if failed and resolution['cached']:
+                    continue
+
+                return OutputFormatHelpers.multi_host_output(results)
+
+            hostname, port = resolution['master']
+            try:
+                status, message, perfdata = cls.check_target(
+                    opts,
+                    hostname,
+                    port,
+                    check,
+                    use_snapshot=use_snapshot,
+                    **check_args
+                )
+            except cls.connection_errors() + (RedisCircuitOpenError,):
+                if resolution['cached']:
+                    continue
+                raise
+
+            return status, OutputFormatHelpers.check_output_string(
+                status,
+                '{s} master {h}:{p}, {m}'.format(
+                    s=opts.sentinel_service,
+                    h=hostname,
+                    p=port,
+                    m=message
+                ),
+                perfdata
+            )
+
+    @classmethod
+    def run_cluster_check(
+            cls,
+            opts,
+            check,
+            use_snapshot=True,
+            **check_args
+    ):
+        """
+        Discover the cluster nodes from the first seed answering and run the
+        check against every node concurrently
+        :return: (status, check output string)
+        """
+        if opts.hosts:
+            seeds = cls.parse_targets(opts.hosts, opts.port)
+        else:
+            seeds = [(opts.hostname, opts.port)]
+
+        for hostname, port in seeds:
+            try:
+                cluster_info, nodes = RedisClusterHelpers.discover(
+                    cls.get_connection(
+                        hostname=hostname,
+                        port=port,
+                        password=opts.password,
+                        **cls.connection_args(opts)
+                    ),
+                    seed_hostname=hostname,
+                    debug=opts.debug
+                )
+                break
+            except cls.connection_errors() as e:
+                if opts.debug:
+                    print("seed {h}:{p} unavailable: {m}".format(h=hostname, p=port, m=e))
+        else:
+            raise Exception("No cluster seed node answered")
+
+        #nodes without address cannot be checked, report them as failed
+        reachable = [node for node in nodes if node['port']]
+        results = cls.fan_out(
+            [(node['hostname'], node['port']) for node in reachable],
+            check,
+            opts,
+            use_snapshot=use_snapshot,
+            **check_args
+        )
+
+        results = [
+            (target, (status, '{r}, {m}'.format(r=node['role'], m=message), perfdata))
+            for node, (target, (status, message, perfdata)) in zip(reachable, results)
+        ]
+        results.extend(
+            (node['id'], ("Critical", "no address, flags {f}".format(f=','.join(node['flags'])), []))
+            for node in nodes if not node['port']
+        )
+
+        return OutputFormatHelpers.multi_host_output(
+            results,
+            summary=RedisClusterHelpers.cluster_result(cluster_info, nodes)
+        )
+
+    @classmethod
+    def check_target(
+            cls,
+            opts,
+            hostname,
+            port,
+            check,
+            use_snapshot=True,
+            **check_args
+    ):
+        """
+        Run a check against one target, through its circuit breaker
+        :return: (status, message, perfdata)
+        """
+        start_time = TimingHelpers.monotonic()
+        try:
+            return cls._check_target(
+                opts,
+                hostname,
+                port,
+                check,
+                use_snapshot=use_snapshot,
+                **check_args
+            )
+        finally:
+            TimingHelpers.record_phase('check', TimingHelpers.monotonic() - start_time)
+
+    @classmethod
+    def _check_target(
+            cls,
+            opts,
+            hostname,
+            port,
+            check,
+            use_snapshot=True,
+            **check_args
+    ):
+        if not opts.breaker_failures:
+            redis_con = cls.connect(opts, hostname, port, use_snapshot=use_snapshot)
+            return check(redis_con, debug=opts.debug, **check_args)
+
+        if opts.socket:
+            instance = cls.instance_key(opts.socket, '', opts.database)
+        else:
+            instance = cls.instance_key(hostname, port, opts.database)
+
+        state = RedisCircuitBreaker.allow(
+            opts.state_dir,
+            instance,
+            failures=opts.breaker_failures,
+            backoff=opts.breaker_backoff,
+            debug=opts.debug
+        )
+
+        try:
+            redis_con = cls.connect(opts, hostname, port, use_snapshot=use_snapshot)
+            result = check(redis_con, debug=opts.debug, **check_args)
+        except RedisDeadlineExhaustedError:
+            #not a failure of the instance, other targets used the budget
+            raise
+        except cls.connection_errors():
+            RedisCircuitBreaker.failure(
+                opts.state_dir,
+                instance,
+                failures=opts.breaker_failures,
+                backoff=opts.breaker_backoff,
+                debug=opts.debug
+            )
+            raise
+
+        if state is not None:
+            RedisCircuitBreaker.success(opts.state_dir, instance)
+
+        return result
+
+    @classmethod
+    def fan_out(
+            cls,
+            targets,
+            check,
+            opts,
+            use_snapshot=True,
+            **check_args
+    ):
+        """
+        Run a check against several targets with a bounded thread pool
+        :param targets: list of (hostname, port) tuples
+        :param check: function(redis_con, debug=False, **check_args)
+                      returning a (status, message, perfdata) tuple
+        :param opts: parsed options from add_default_parser_options
+        :return: list of ("hostname:port", (status, message, perfdata))
+        """
+        from multiprocessing.pool import ThreadPool
+
+        def check_target(target):
+            hostname, port = target
+            try:
+                return cls.check_target(
+                    opts,
+                    hostname,
+                    port,
+                    check,
+                    use_snapshot=use_snapshot,
+                    **check_args
+                )
+            except RedisDeadlineError as e:
+                return opts.timeout_state, "{m}".format(m=e), []
+            except Exception as e:
+                return "Critical", "{m}".format(m=e), []
+
+        pool = ThreadPool(max(1, min(opts.workers, len(targets))))
+        try:
+            results = pool.map(check_target, targets)
+        finally:
+            pool.close()
+            pool.join()
+
+        return [
+            ("{h}:{p}".format(h=hostname, p=port), result)
+            for (hostname, port), result in zip(targets, results)
+        ]
+
+    @classmethod
+    def get_info(
+            cls,
+            redis_con=None,
+            sections=None,
+            debug=False
+    ):
+        """
+        Get redis INFO, restricted to the given sections
+        :param redis_con: redis connection
+        :type redis_con: redis.StrictRedis
+        :param sections: INFO sections needed by the check (memory, clients, ...).
+                         None fetch every section
+        :type sections: list
+        :return: merged INFO dict
+        """
+        if isinstance(redis_con, RedisSnapshot):
+            info = redis_con.info
+        elif not cls.is_connection(redis_con):
+            raise Exception("Cannot get informations if not connected to redis")
+        elif not sections:
+            info = redis_con.info('all')
+        elif len(sections) == 1:
+            info = redis_con.info(sections[0])
+        else:
+            #one INFO per section, sent in a single round trip
+            pipe = redis_con.pipeline(transaction=False)
+            for section in sections:
+                pipe.info(section)
+            info = {}
+            for section_info in pipe.execute():
+                info.update(section_info)
+
+        if debug:
+            from pprint import pprint
+
+            print("info")
+            print("----")
+            pprint(info)
+
+        return info
+
+    @classmethod
+    def get_maxmemory(
+            cls,
+            redis_con=None,
+            debug=False
+    ):
+        if isinstance(redis_con, RedisSnapshot):
+            maxmemory = long(redis_con.maxmemory)
+        elif not cls.is_connection(redis_con):
+            raise Exception("Cannot get maxmemory if not connected to redis")
+        else:
+            maxmemory = long(redis_con.config_get('maxmemory')['maxmemory'])
+
+        return cls._validate_maxmemory(maxmemory, debug=debug)
+
+    @classmethod
+    def _validate_maxmemory(
+            cls,
+            maxmemory,
+            check_zero=True,
+            debug=False
+    ):
+        if debug:
+            from hurry.filesize import size, alternative
+
+            print("Current maxmemory")
+            print("-----------------")
+            print(
+                "maxmemory: {m}".format(
+                    m=size(
+                        maxmemory,
+                        alternative
+                    )
+                )
+            )
+
+        if check_zero and maxmemory == 0:
+            raise Exception("maxmemory = 0 cannot evaluate usage")
+
+        return maxmemory
+
+    @classmethod
+    def get_info_and_config(
+            cls,
+            redis_con=None,
+            sections=None,
+            parameters=(),
+            debug=False
+    ):
+        """
+        Get redis INFO and config parameters in a single round trip.
+        INFO and a CONFIG GET per parameter are pipelined, an unreadable
+        parameter (disabled or renamed CONFIG command) is not an error here.
+        :param redis_con: redis connection or snapshot
+        :type redis_con: redis.StrictRedis
+        :param sections: INFO sections needed by the check. None fetch every section
+        :type sections: list
+        :param parameters: CONFIG GET parameters, a snapshot serves maxmemory and maxclients
+        :type parameters: list
+        :return: (merged INFO dict, dict of parameter -> value or the
+                 exception raised reading it)
+        """
+        if isinstance(redis_con, RedisSnapshot):
+            info = cls.get_info(
+                redis_con=redis_con,
+                sections=sections,
+                debug=debug
+            )
+            config = {}
+            for parameter in parameters:
+                try:
+                    config[parameter] = getattr(redis_con, parameter)
+                except Exception as e:
+                    config[parameter] = e
+            return info, config
+
+        if not cls.is_connection(redis_con):
+            raise Exception("Cannot get informations if not connected to redis")
+
+        if not sections:
+            sections = ['all']
+
+        pipe = redis_con.pipeline(transaction=False)
+        for section in sections:
+            pipe.info(section)
+        for parameter in parameters:
+            pipe.config_get(parameter)
+        replies = pipe.execute(raise_on_error=False)
+
+        info = {}
+        for section_info in replies[:len(sections)]:
+            if isinstance(section_info, Exception):
+                raise section_info
+            info.update(section_info)
+
+        config = {}
+        for parameter, reply in zip(parameters, replies[len(sections):]):
+            if isinstance(reply, Exception):
+                config[parameter] = reply
+            else:
+                config[parameter] = reply.get(parameter)
+
+        if debug:
+            from pprint import pprint
+
+            print("info")
+            print("----")
+            pprint(info)
+
+        return info, config
+
+    @classmethod
+    def config_maxmemory(
+            cls,
+            info,
+            config,
+            check_zero=True,
+            debug=False
+    ):
+        """
+        maxmemory from INFO memory, from CONFIG GET maxmemory on redis < 3.2
+        :param config: config from get_info_and_config, with maxmemory
+        :param check_zero: raise if maxmemory is not set
+        """
+        if 'maxmemory' in info:
+            maxmemory = long(info['maxmemory'])
+        else:
+            if isinstance(config['maxmemory'], Exception):
+                raise config['maxmemory']
+            maxmemory = long(config['maxmemory'])
+
+        return cls._validate_maxmemory(
+            maxmemory,
+            check_zero=check_zero,
+            debug=debug
+        )
+
+    @classmethod
+    def get_info_and_maxmemory(
+            cls,
+            redis_con=None,
+            sections=None,
+            check_zero=True,
+            debug=False
+    ):
+        """
+        Get redis INFO and maxmemory in a single round trip.
+        INFO and CONFIG GET maxmemory are pipelined, the CONFIG GET reply is
+        only used when the INFO memory section does not report maxmemory
+        (redis < 3.2), so a disabled or renamed CONFIG command is not an
+        error on newer servers.
+        :param redis_con: redis connection
+        :type redis_con: redis.StrictRedis
+        :param sections: INFO sections needed by the check, memory is always added.
+                         None fetch every section
+        :type sections: list
+        :param check_zero: raise if maxmemory is not set
+        :return: (merged INFO dict, maxmemory)
+        """
+        if sections and 'memory' not in sections:
+            sections = list(sections) + ['memory']
+
+        info, config = cls.get_info_and_config(
+            redis_con=redis_con,
+            sections=sections,
+            parameters=['maxmemory'],
+            debug=debug
+        )
+
+        maxmemory = cls.config_maxmemory(
+            info,
+            config,
+            check_zero=check_zero,
+            debug=debug
+        )
+
+        return info, maxmemory
+
+    @classmethod
+    def get_maxclients(
+            cls,
+            redis_con=None,
+            debug=False
+    ):
+        if isinstance(redis_con, RedisSnapshot):
+            maxclients = long(redis_con.maxclients)
+        elif not cls.is_connection(redis_con):
+            raise Exception("Cannot get maxclients if not connected to redis")
+        else:
+            maxclients = long(redis_con.config_get('maxclients')['maxclients'])
+
+        if debug:
+            print("Current maxclients")
+            print("------------------")
+            print("maxclients: {m}".format(m=maxclients))
+
+        return maxclients
+
+
+class RedisClusterHelpers(object):
+    #number of hash slots of a redis cluster
+    SLOTS = 16384
+
+    @classmethod
+    def parse_nodes(
+            cls,
+            nodes,
+            seed_hostname=None
+    ):
+        """
+        Parse a CLUSTER NODES reply
+        :param nodes: CLUSTER NODES reply
+        :type nodes: str
+        :param seed_hostname: hostname used for the node answering without address
+        :return: list of dict with id, hostname, port, role, master, flags and slots keys
+        """
+        parsed = []
+
+        for line in nodes.splitlines():
+            fields = line.split()
+            if len(fields) < 8:
+                continue
+
+            #ip:port, ip:port@cport or ip:port@cport,hostname
+            address = fields[1].split('@')[0]
+            hostname, _, port = address.rpartition(':')
+            flags = fields[2].split(',')
+
+            if not hostname and 'myself' in flags:
+                hostname = seed_hostname
+
+            #slots of a master: "0-5460", "5461", migrating ones are "[...]"
+            slots = 0
+            for slot_range in fields[8:]:
+                if slot_range.startswith('['):
+                    continue
+                first, _, last = slot_range.partition('-')
+                slots += int(last or first) - int(first) + 1
+
+            parsed.append({
+                'id': fields[0],
+                'hostname': hostname,
+                'port': int(port) if port and port != '0' else None,
+                'role': 'master' if 'master' in flags else 'replica',
+                'master': fields[3] if fields[3] != '-' else None,
+                'flags': flags,
+                'slots': slots
+            })
+
+        return parsed
+
+    @classmethod
+    def discover(
+            cls,
+            redis_con,
+            seed_hostname=None,
+            debug=False
+    ):
+        """
+        Get the cluster state and its nodes from one node, in one round trip
+        :param redis_con: redis connection to a cluster node
+        :type redis_con: redis.StrictRedis
+        :return: (CLUSTER INFO dict, list of nodes from parse_nodes)
+        """
+        pipe = redis_con.pipeline(transaction=False)
+        pipe.execute_command('CLUSTER', 'INFO')
+        pipe.execute_command('CLUSTER', 'NODES')
+        cluster_info, cluster_nodes = pipe.execute()
+
+        cluster_info = dict(
+            line.split(':', 1)
+            for line in cluster_info.splitlines()
+            if ':' in line
+        )
+        nodes = cls.parse_nodes(cluster_nodes, seed_hostname)
+
+        if debug:
+            print("cluster nodes")
+            print("-------------")
+            for node in nodes:
+                print("{h}:{p} {r} {f} {s} slots".format(
+                    h=node['hostname'],
+                    p=node['port'],
+                    r=node['role'],
+                    f=','.join(node['flags']),
+                    s=node['slots']
+                ))
+
+        return cluster_info, nodes
+
+    @classmethod
+    def cluster_result(
+            cls,
+            cluster_info,
+            nodes
+    ):
+        """
+        Evaluate the cluster state and slot coverage
+        :return: (status, message, perfdata)
+        """
+        #slots served by a master not flagged as failing
+        covered = sum(
+            node['slots'] for node in nodes
+            if node['role'] == 'master' and 'fail' not in node['flags']
+        )
+        masters = len([node for node in nodes if node['role'] == 'master'])
+        replicas = len(nodes) - masters
+        state = cluster_info.get('cluster_state', 'unknown')
+        pfail = int(cluster_info.get('cluster_slots_pfail', 0))
+
+        status = "OK"
+        if pfail:
+            status = "Warning"
+        if state != 'ok' or covered < cls.SLOTS:
+            status = "Critical"
+
+        message = "cluster_state {s}, {c}/{t} slots covered, {m} masters, {r} replicas".format(
+            s=state,
+            c=covered,
+            t=cls.SLOTS,
+            m=masters,
+            r=replicas
+        )
+        if pfail:
+            message += ", {p} slots in pfail".format(p=pfail)
+
+        perfdata = [
+            OutputFormatHelpers.perf_data_string(
+                label="cluster_slots_covered",
+                value=covered,
+                crit='{s}:'.format(s=cls.SLOTS),
+                min=0,
+                max=cls.SLOTS
+            ),
+            OutputFormatHelpers.perf_data_string(
+                label="cluster_slots_pfail",
+                value=pfail,
+                warn=0,
+                min=0,
+                max=cls.SLOTS
+            ),
+            OutputFormatHelpers.perf_data_string(
+                label="cluster_masters",
+                value=masters,
+                min=0
+            ),
+            OutputFormatHelpers.perf_data_string(
+                label="cluster_replicas",
+                value=replicas,
+                min=0
+            )
+        ]
+
+        return status, message, perfdata
+
+
+class RedisSentinelHelpers(object):
+    #seconds a sentinel resolution is reused before asking the sentinels again
+    TTL = 30
+    #seconds to wait for each sentinel
+    TIMEOUT = 1.0
+
+    @classmethod
+    def resolve(
+            cls,
+            sentinels,
+            service,
+            state_dir,
+            ttl=TTL,
+            refresh=False,
+            debug=False
+    ):
+        """
+        Get the current master and replicas of a sentinel service, from the
+        resolution cached in state_dir when it is younger than ttl
+        :param sentinels: list of (hostname, port) sentinels
+        :param service: sentinel service (master) name
+        :param refresh: ignore the cached resolution
+        :return: dict with master (hostname, port), replicas list of
+                 (hostname, port) and cached keys
+        """
+        #services of different sentinel groups may share a name
+        state_key = "{s}_{g}".format(
+            s=service,
+            g=",".join(sorted("{h}:{p}".format(h=h, p=p) for h, p in sentinels))
+        )
+
+        if not refresh:
+            resolution = RedisStateStore.load(state_dir, 'sentinel', state_key)
+            if resolution and 0 <= time.time() - resolution.get('time', 0) < ttl:
+                if debug:
+                    print("sentinel resolution from cache: {r}".format(r=resolution))
+                return {
+                    'master': tuple(resolution['master']),
+                    'replicas': [tuple(replica) for replica in resolution['replicas']],
+                    'cached': True
+                }
+
+        from redis.sentinel import Sentinel
+
+        sentinel = Sentinel(
+            sentinels,
+            sentinel_kwargs={'socket_timeout': cls.TIMEOUT}
+        )
+        master = sentinel.discover_master(service)
+        replicas = sentinel.discover_slaves(service)
+
+        if debug:
+            print("sentinel resolution: master {m}, replicas {r}".format(m=master, r=replicas))
+
+        RedisStateStore.save(
+            state_dir,
+            'sentinel',
+            state_key,
+            {
+                'time': time.time(),
+                'master': list(master),
+                'replicas': [list(replica) for replica in replicas]
+            }
+        )
+
+        return {
+            'master': tuple(master),
+            'replicas': [tuple(replica) for replica in replicas],
+            'cached': False
+        }
+
+
+class RedisSnapshot(object):
+    """
+    INFO and config values of one redis instance, as cached by
+    redis_check_agent.py. Accepted by the RedisCheckHelpers getters in
+    place of a redis connection.
+    """
+
+    def __init__(
+            self,
+            info,
+            maxmemory=0,
+            maxclients=0,
+            age=0,
+            instance=None
+    ):
+        self.info = info
+        self.maxmemory = maxmemory
+        self.maxclients = maxclients
+        self.age = age
+        self.instance = instance
+
+    def __getattr__(self, name):
+        raise Exception(
+            "{n} is not served by the check agent, run the check without --agent-socket".format(
+                n=name
+            )
+        )
+
+
+class RedisAgentHelpers(object):
+    #seconds to wait for the agent before connecting to redis directly
+    TIMEOUT = 1.0
+
+    @classmethod
+    def get_snapshot(
+            cls,
+            socket_path,
+            hostname,
+            port,
+            database=0
+    ):
+        """
+        Ask the check agent for the cached snapshot of an instance.
+        The request and the reply are one JSON document per line.
+        :param socket_path: agent unix socket
+        :return: RedisSnapshot
+        """
+        import json
+        import socket
+
+        agent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        agent.settimeout(cls.TIMEOUT)
+        try:
+            agent.connect(socket_path)
+            agent.sendall(
+                json.dumps({
+                    'instance': RedisCheckHelpers.instance_key(hostname, port, database)
+                }) + '\n'
+            )
+            reply = agent.makefile('r').readline()
+        finally:
+            agent.close()
+
+        if not reply:
+            raise Exception("Empty reply from check agent")
+
+        reply = json.loads(reply)
+        if 'error' in reply:
+            raise Exception(reply['error'])
+
+        return RedisSnapshot(
+            reply['info'],
+            maxmemory=reply['maxmemory'],
+            maxclients=reply['maxclients'],
+            age=reply['age'],
+            instance=RedisCheckHelpers.instance_key(hostname, port, database)
+        )
+
+
+class RedisSnapshotCache(object):
+    """
+    INFO snapshots shared on local disk by the checks of the same instance.
+    One process refreshes an expired snapshot under an exclusive file lock,
+    the others wait for it and reuse the new one.
+    """
+    #seconds a snapshot is reused
+    MAX_AGE = 5
+
+    @classmethod
+    def cache_path(
+            cls,
+            cache_dir,
+            redis_con
+    ):
+        key = RedisCheckHelpers.get_instance_key(redis_con)
+
+        return os.path.join(
+            cache_dir,
+            "redis_info_{k}.json".format(
+                k="".join(c if c.isalnum() or c in '-.' else '_' for c in key)
+            )
+        )
+
+    @classmethod
+    def read(
+            cls,
+            path,
+            max_age
+    ):
+        """
+        :return: the cached snapshot dict if younger than max_age, None otherwise
+        """
+        import json
+
+        try:
+            with open(path) as cache_file:
+                snapshot = json.load(cache_file)
+        except (IOError, ValueError):
+            return None
+
+        age = time.time() - snapshot['timestamp']
+        if age < 0 or age > max_age:
+            return None
+
+        snapshot['age'] = age
+
+        return snapshot
+
+    @classmethod
+    def get_snapshot(
+            cls,
+            cache_dir,
+            max_age,
+            redis_con,
+            debug=False
+    ):
+        """
+        Get the cached snapshot of the redis_con instance, refresh it if expired
+        :param cache_dir: cache directory, created if needed
+        :param max_age: seconds a snapshot is reused
+        :type redis_con: redis.StrictRedis
+        :return: RedisSnapshot
+        """
+        import fcntl
+        import json
+
+        path = cls.cache_path(cache_dir, redis_con)
+
+        snapshot = cls.read(path, max_age)
+
+        if snapshot is None:
+            if not os.path.isdir(cache_dir):
+                try:
+                    os.makedirs(cache_dir)
+                except OSError:
+                    if not os.path.isdir(cache_dir):
+                        raise
+
+            with open(path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    #another check may have refreshed it while we waited
+                    snapshot = cls.read(path, max_age)
+
+                    if snapshot is None:
+                        snapshot = RedisCheckHelpers.fetch_snapshot(redis_con)
+                        snapshot['timestamp'] = time.time()
+
+                        tmp_path = "{p}.{pid}.tmp".format(p=path, pid=os.getpid())
+                        with open(tmp_path, 'w') as cache_file:
+                            json.dump(snapshot, cache_file)
+                        os.rename(tmp_path, path)
+
+                        snapshot['age'] = 0
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        if debug:
+            print("INFO snapshot from {p}, age {a:.3f}s".format(p=path, a=snapshot['age']))
+
+        return RedisSnapshot(
+            snapshot['info'],
+            maxmemory=snapshot['maxmemory'],
+            maxclients=snapshot['maxclients'],
+            age=snapshot['age'],
+            instance=RedisCheckHelpers.get_instance_key(redis_con)
+        )
+
+
+class RedisCircuitOpenError(Exception):
+    """
+    The instance failed too many times in a row, the check fails fast until
+    the backoff expires
+    """
+
+
+class RedisCircuitBreaker(object):
+    """
+    Consecutive connection failures per instance, shared by every check
+    process through a state file. After FAILURES failures checks fail fast
+    for BACKOFF seconds, then one check probes the instance again.
+    """
+    FAILURES = 3
+    BACKOFF = 60
+
+    @classmethod
+    def _locked(
+            cls,
+            state_dir,
+            instance
+    ):
+        import fcntl
+
+        if not os.path.isdir(state_dir):
+            try:
+                os.makedirs(state_dir)
+            except OSError:
+                if not os.path.isdir(state_dir):
+                    raise
+
+        lock_file = open(RedisStateStore.path(state_dir, 'breaker', instance, extension='lock'), 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        return lock_file
+
+    @classmethod
+    def allow(
+            cls,
+            state_dir,
+            instance,
+            failures=FAILURES,
+            backoff=BACKOFF,
+            debug=False
+    ):
+        """
+        Raise RedisCircuitOpenError while the circuit of instance is open.
+        Once the backoff expired, the first caller is let through as probe
+        and the backoff restarts for the others.
+        :return: the breaker state, None when the instance has no failure
+        """
+        state = RedisStateStore.load(state_dir, 'breaker', instance)
+        if state is None or state['failures'] < failures:
+            return state
+
+        if time.time() < state['open_until']:
+            raise RedisCircuitOpenError(
+                "{i} failed {f} times in a row, next probe in {s:.0f} s".format(
+                    i=instance,
+                    f=state['failures'],
+                    s=state['open_until'] - time.time()
+                )
+            )
+
+        with cls._locked(state_dir, instance):
+            #another check may have claimed the probe while we waited
+            state = RedisStateStore.load(state_dir, 'breaker', instance)
+            if state is not None and time.time() < state['open_until']:
+                raise RedisCircuitOpenError(
+                    "{i} failed {f} times in a row, probe running".format(
+                        i=instance,
+                        f=state['failures']
+                    )
+                )
+
+            if state is not None:
+                state['open_until'] = time.time() + backoff
+                RedisStateStore.save(state_dir, 'breaker', instance, state)
+
+        if debug:
+            print("circuit of {i} half open, probing".format(i=instance))
+
+        return state
+
+    @classmethod
+    def failure(
+            cls,
+            state_dir,
+            instance,
+            failures=FAILURES,
+            backoff=BACKOFF,
+            debug=False
+    ):
+        """
+        Count a failure of instance, open its circuit after failures in a row.
+        An unwritable state_dir is ignored, not to hide the connection error.
+        """
+        try:
+            with cls._locked(state_dir, instance):
+                state = RedisStateStore.load(state_dir, 'breaker', instance) or {
+                    'failures': 0,
+                    'open_until': 0
+                }
+                state['failures'] += 1
+                if state['failures'] >= failures:
+                    state['open_until'] = time.time() + backoff
+                RedisStateStore.save(state_dir, 'breaker', instance, state)
+        except (IOError, OSError) as e:
+            if debug:
+                print("cannot save the circuit breaker state: {m}".format(m=e))
+
+    @classmethod
+    def success(
+            cls,
+            state_dir,
+            instance
+    ):
+        try:
+            os.unlink(RedisStateStore.path(state_dir, 'breaker', instance))
+        except OSError:
+            pass
+
+
+class RedisStateStore(object):
+    """
+    Per instance JSON state kept by checks between two runs
+    """
+    STATE_DIR = '/var/tmp/check-redis'
+
+    @classmethod
+    def path(
+            cls,
+            state_dir,
+            name,
+            instance,
+            extension='json'
+    ):
+        return os.path.join(
+            state_dir,
+            "{n}_{i}.{e}".format(
+                n=name,
+                i="".join(c if c.isalnum() or c in '-.' else '_' for c in instance),
+                e=extension
+            )
+        )
+
+    @classmethod
+    def load(
+            cls,
+            state_dir,
+            name,
+            instance
+    ):
+        """
+        :return: the saved state, None if there is none or it is unreadable
+        """
+        import json
+
+        try:
+            with open(cls.path(state_dir, name, instance)) as state_file:
+                return json.load(state_file)
+        except (IOError, ValueError):
+            return None
+
+    @classmethod
+    def save(
+            cls,
+            state_dir,
+            name,
+            instance,
+            state
+    ):
+        import json
+
+        if not os.path.isdir(state_dir):
+            try:
+                os.makedirs(state_dir)
+            except OSError:
+                if not os.path.isdir(state_dir):
+                    raise
+
+        path = cls.path(state_dir, name, instance)
+        tmp_path = "{p}.{pid}.tmp".format(p=path, pid=os.getpid())
+        with open(tmp_path, 'w') as state_file:
+            json.dump(state, state_file)
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def get_rates(
+            cls,
+            state_dir,
+            name,
+            instance,
+            redis_info,
+            counters,
+            timestamp=None,
+            debug=False
+    ):
+        """
+        Per second rates of cumulative INFO counters since the previous run.
+        The current counters are saved for the next run. A restart (new
+        run_id, uptime going back) or a CONFIG RESETSTAT (counter going back)
+        gives no rate for this run.
+        :param name: state name, one per check
+        :param instance: instance key, see RedisCheckHelpers.get_instance_key
+        :param redis_info: INFO dict with the server and counters sections
+        :param counters: INFO counters names
+        :param timestamp: when redis_info was taken. Default : now
+        :return: (dict of counter -> rate per second, interval in seconds),
+                 (None, None) without usable previous counters
+        """
+        current = {
+            'timestamp': timestamp or time.time(),
+            'run_id': redis_info.get('run_id'),
+            'uptime_in_seconds': redis_info.get('uptime_in_seconds'),
+            'counters': dict(
+                (counter, long(redis_info.get(counter, 0)))
+                for counter in counters
+            )
+        }
+
+        previous = cls.load(state_dir, name, instance)
+        cls.save(state_dir, name, instance, current)
+
+        if previous is None:
+            if debug:
+                print("no previous counters for {i}".format(i=instance))
+            return None, None
+
+        interval = current['timestamp'] - previous['timestamp']
+
+        reset = (
+            previous.get('run_id') != current['run_id'] or
+            previous.get('uptime_in_seconds') > current['uptime_in_seconds'] or
+            interval <= 0
+        )
+
+        rates = {}
+        #no interval to divide by after a reset or a clock going back
+        if not reset:
+            for counter in counters:
+                if counter not in previous['counters']:
+                    reset = True
+                    break
+                delta = current['counters'][counter] - previous['counters'][counter]
+                if delta < 0:
+                    reset = True
+                    break
+                rates[counter] = delta / interval
+
+        if reset:
+            if debug:
+                print("counters reset on {i}, no rate for this run".format(i=instance))
+            return None, None
+
+        if debug:
+            from pprint import pprint
+
+            print("rates over {t:.1f}s".format(t=interval))
+            print("-----")
+            pprint(rates)
+
+        return rates, interval
+
+
+class ForecastHelpers(object):
+    @classmethod
+    def linear_fit(
+            cls,
+            samples
+    ):
+        """
+        Least squares line through (timestamp, value) samples
+        :param samples: list of (timestamp, value)
+        :return: (slope per second, value at the first timestamp), None with
+                 less than 2 distinct timestamps
+        """
+        if len(samples) < 2:
+            return None
+
+        t0 = samples[0][0]
+        n = float(len(samples))
+        mean_t = sum(t - t0 for t, v in samples) / n
+        mean_v = sum(v for t, v in samples) / n
+
+        var_t = sum((t - t0 - mean_t) ** 2 for t, v in samples)
+        if var_t == 0:
+            return None
+
+        cov = sum((t - t0 - mean_t) * (v - mean_v) for t, v in samples)
+        slope = cov / var_t
+
+        return slope, mean_v - slope * mean_t
+
+    @classmethod
+    def time_to_reach(
+            cls,
+            samples,
+            target
+    ):
+        """
+        Project when the last sample value reaches target at the fitted growth rate
+        :param samples: list of (timestamp, value), oldest first
+        :param target: value to reach
+        :return: (seconds until target, slope per second), seconds is None
+                 when the value is not growing
+        """
+        fit = cls.linear_fit(samples)
+        if fit is None:
+            return None, None
+
+        slope = fit[0]
+        if slope <= 0:
+            return None, slope
+
+        return max(target - samples[-1][1], 0) / slope, slope
+
+
+class RedisCheckEvaluators(object):
+    """
+    Check logic shared by the check_redis_*.py scripts and check_redis_all.py.
+    Every evaluator works on already fetched data and returns a
+    (status, message, perfdata) tuple.
+    """
+
+    #INFO sections each evaluator reads
+    INFO_SECTIONS = {
+        'memory': ['memory'],
+        'maxmemory': ['memory'],
+        'connected_clients': ['clients'],
+        'blocked_clients': ['clients']
+    }
+
+    @classmethod
+    def threshold_status(
+            cls,
+            value,
+            warning,
+            critical,
+            below=False
+    ):
+        """
+        Compare a value against warning/critical levels
+        :param value: measured value
+        :param warning: Warning level, None or '' to disable it
+        :param critical: Critical level, None or '' to disable it
+        :param below: alert when the value goes under the levels instead of over
+        :return: state in ['OK', 'Warning', 'Critical']
+        """
+        status = "OK"
+
+        for level, state in [(warning, "Warning"), (critical, "Critical")]:
+            if level is None or level == '':
+                continue
+            if (value <= level) if below else (value >= level):
+                status = state
+
+        return status
+
+    @classmethod
+    def memory(
+            cls,
+            redis_info,
+            redis_maxmemory,
+            warning,
+            critical,
+            debug=False
+    ):
+        from hurry.filesize import size, alternative
+
+        redis_memory_used = long(redis_info['used_memory'])
+        redis_memory_used_rss = long(redis_info['used_memory_rss'])
+
+        if debug:
+            print("memory used")
+            print("-----------")
+            print(
+                "used_memory: {m}".format(
+                    m=size(
+                        redis_memory_used,
+                        alternative
+                    )
+                )
+            )
+            print(
+                "used_memory_rss: {m}".format(
+                    m=size(
+                        redis_memory_used_rss,
+                        alternative
+                    )
+                )
+            )
+
+        perfdata = [
+            OutputFormatHelpers.perf_data_string(
+                label="used_memory",
+                value=redis_memory_used,
+                warn=warning,
+                crit=critical,
+                min=0,
+                max=redis_maxmemory,
+                UOM='B'
+            ),
+            OutputFormatHelpers.perf_data_string(
+                label="used_memory_rss",
+                value=redis_memory_used_rss,
+                UOM='B'
+            )
+        ]
+
+        status = cls.threshold_status(redis_memory_used, warning, critical)
+
+        message = '{used} memory usage'.format(
+            used=size(redis_memory_used, alternative)
+        )
+
+        return status, message, perfdata
+
+    @classmethod
+    def maxmemory(
+            cls,
+            redis_info,
+            redis_maxmemory,
+            warning,
+            critical,
+            debug=False
+    ):
+        from decimal import Decimal, ROUND_UP
+        from hurry.filesize import size, alternative
+
+        redis_memory_used = long(redis_info['used_memory'])
+
+        if debug:
+            print("memory used")
+            print("-----------")
+            print(
+                "used_memory: {m}".format(
+                    m=size(
+                        redis_memory_used,
+                        alternative
+                    )
+                )
+            )
+
+        current_redis_memory_usage = (float(redis_memory_used) * 100)/(float(redis_maxmemory))
+        current_redis_memory_usage = Decimal(current_redis_memory_usage).quantize(
+            Decimal('1.01'),
+            rounding=ROUND_UP
+        )
+
+        if debug:
+            print("current memory usage")
+            print("--------------------")
+            print("memory usage : {u}%".format(u=current_redis_memory_usage))
+
+        perfdata = [
+            OutputFormatHelpers.perf_data_string(
+                label="redis_memory_usage",
+                value=current_redis_memory_usage,
+                warn=warning,
+                crit=critical,
+                UOM='%'
+            )
+        ]
+
+        status = cls.threshold_status(current_redis_memory_usage, warning, critical)
+
+        message = '{used}% of {max}'.format(
+            used=current_redis_memory_usage,
+            max=size(redis_maxmemory, alternative)
+        )
+
+        return status, message, perfdata
+
+    @classmethod
+    def connected_clients(
+            cls,
+            redis_info,
+            redis_maxclients,
+            warning,
+            critical,
+            debug=False
+    ):
+        redis_connected_clients = long(redis_info['connected_clients'])
+
+        if debug:
+            print("connected clients")
+            print("-----------")
+            print(
+                "connected_clients: {m}".format(
+                    m=redis_connected_clients
+                )
+            )
+            print(
+                "maxclients: {m}".format(
+                    m=redis_maxclients
+                )
+            )
+
+        perfdata = [
+            OutputFormatHelpers.perf_data_string(
+                label="connected_clients",
+                value=redis_connected_clients,
+                warn=warning,
+                crit=critical,
+                min=0,
+                max=redis_maxclients
+            )
+        ]
+
+        status = cls.threshold_status(redis_connected_clients, warning, critical)
+
+        message = '{n} connected clients'.format(
+            n=redis_connected_clients
+        )
+
+        return status, message, perfdata
+
+    @classmethod
+    def blocked_clients(
+            cls,
+            redis_info,
+            warning,
+            critical,
+            debug=False
+    ):
+        redis_blocked_clients = long(redis_info['blocked_clients'])
+
+        if debug:
+            print("blocked clients")
+            print("-----------")
+            print(
+                "blocked_clients: {m}".format(
+                    m=redis_blocked_clients
+                )
+            )
+
+        perfdata = [
+            OutputFormatHelpers.perf_data_string(
+                label="blocked_clients",
+                value=redis_blocked_clients,
+                warn=warning,
+                crit=critical
+            )
+        ]
+
+        status = cls.threshold_status(redis_blocked_clients, warning, critical)
+
+        message = '{n} blocked clients'.format(
+            n=redis_blocked_clients
+        )
+
+        return status, message, perfdata
+
+
+class TimingHelpers(object):
+    _monotonic = None
+    #seconds spent per phase of the check run, for --timings
+    _phases = None
+    _phases_lock = threading.Lock()
+
+    @classmethod
+    def monotonic(cls):
+        """
+        Monotonic high resolution clock, in seconds.
+        time.monotonic on python 3, clock_gettime(CLOCK_MONOTONIC) through
+        ctypes on python 2 linux, time.time as last resort
+        """
+        if cls._monotonic is None:
+            cls._monotonic = staticmethod(cls._get_monotonic_clock())
+
+        return cls._monotonic()
+
+    @classmethod
+    def _get_monotonic_clock(cls):
+        if hasattr(time, 'monotonic'):
+            return time.monotonic
+
+        try:
+            import ctypes
+            import ctypes.util
+
+            class timespec(ctypes.Structure):
+                _fields_ = [
+                    ('tv_sec', ctypes.c_long),
+                    ('tv_nsec', ctypes.c_long)
+                ]
+
+            librt = ctypes.CDLL(
+                ctypes.util.find_library('rt') or 'libc.so.6',
+                use_errno=True
+            )
+            clock_gettime = librt.clock_gettime
+            clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+            CLOCK_MONOTONIC = 1
+
+            def monotonic():
+                t = timespec()
+                if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+                    raise OSError(ctypes.get_errno(), "clock_gettime failed")
+                return t.tv_sec + t.tv_nsec * 1e-9
+
+            monotonic()
+            return monotonic
+        except (OSError, AttributeError):
+            return time.time
+
+    @classmethod
+    def percentile(
             cls,
-            parser
+            samples,
+            percent
     ):
-        parser.add_option('-H', '--hostname',type="str", default="localhost",
-                          dest="hostname",
-                          help='Hostname to connect to. Default : locahost')
-        parser.add_option('-p', '--port',
-                          dest="port", type="int", default=6379,
-                          help='Redis port to connect to. Default : 6379')
-        parser.add_option('-P', '--password',
-                          dest="password", type="str", default=None,
-                          help='Redis password used for connection. Default : None')
-        parser.add_option('--db',
-                          dest="database", type="int", default=0,
-                          help='Redis database to connect to. Default : 0')
-        parser.add_option('--debug',
-                          dest="debug", default=False, action="store_true",
-                          help='Enable debug')
+        """
+        Nearest rank percentile
+        :param samples: list of measured values
+        :param percent: percentile in [0, 100]
+        :return: the smallest sample greater or equal to percent % of the samples
+        """
+        if not samples:
+            raise Exception("Cannot compute a percentile without samples")
 
-        return parser
+        ordered = sorted(samples)
+        rank = int(math.ceil(percent / 100.0 * len(ordered)))
+
+        return ordered[min(max(rank, 1), len(ordered)) - 1]
 
     @classmethod
-    def get_info(
+    def record_phase(
             cls,
-            redis_con=None,
-            debug=False
+            phase,
+            seconds
     ):
-        if not isinstance(redis_con, redis.StrictRedis):
-            raise Exception("Cannot get informations if not connected to redis")
+        """
+        Add seconds to a phase of the check run, phases are kept in the
+        order they are first recorded
+        """
+        from collections import OrderedDict
 
-        info = redis_con.info('all')
+        with cls._phases_lock:
+            if cls._phases is None:
+                cls._phases = OrderedDict()
+            cls._phases[phase] = cls._phases.get(phase, 0) + seconds
 
-        if debug:
-            print("info")
-            print("----")
-            pprint(info)
+    @classmethod
+    def process_age(
+            cls,
+            at=None
+    ):
+        """
+        Seconds between the start of this process and at, 10 ms resolution
+        :param at: time.time() timestamp, default now
+        :return: seconds, None where /proc is not available
+        """
+        try:
+            with open('/proc/self/stat') as stat_file:
+                #fields after the command name, starttime is field 22
+                fields = stat_file.read().rsplit(')', 1)[1].split()
+            with open('/proc/uptime') as uptime_file:
+                uptime = float(uptime_file.read().split()[0])
+        except (IOError, IndexError, ValueError):
+            return None
 
-        return info
+        start = float(fields[19]) / os.sysconf('SC_CLK_TCK')
+
+        return uptime - start - (time.time() - (at or time.time()))
 
     @classmethod
-    def get_maxmemory(
+    def phases_perf_data(cls):
+        """
+        :return: Array of perf data string, one per phase and the total
+        """
+        phases = list((cls._phases or {}).items())
+        phases.append((
+            'total',
+            dict(phases).get('startup', 0) + time.time() - IMPORT_START
+        ))
+
+        return [
+            OutputFormatHelpers.perf_data_string(
+                label="timing_{p}".format(p=phase),
+                value="{v:.3f}".format(v=seconds * 1000),
+                UOM='ms',
+                min=0
+            )
+            for phase, seconds in phases
+        ]
+
+    @classmethod
+    def print_phases(cls):
+        print("Timings")
+        print("-------")
+        for phase, seconds in (cls._phases or {}).items():
+            print("{p}: {v:.3f} ms".format(p=phase, v=seconds * 1000))
+
+
+class RedisDeadlineError(Exception):
+    """
+    The --timeout deadline of a check expired, phase is where: connect, auth or command
+    """
+
+    def __init__(
+            self,
+            phase,
+            timeout,
+            target=None
+    ):
+        super(RedisDeadlineError, self).__init__(
+            "Timeout during {p}{t} after {s:.1f} s".format(
+                p=phase,
+                t=" to {t}".format(t=target) if target else '',
+                s=timeout
+            )
+        )
+        self.phase = phase
+
+
+class RedisDeadlineExhaustedError(RedisDeadlineError):
+    """
+    The --timeout deadline of a check expired before a connect to the target
+    started, other targets of the run used it: the target was not checked
+    """
+
+    def __init__(
+            self,
+            timeout,
+            target=None
+    ):
+        Exception.__init__(
+            self,
+            "Deadline of {s:.1f} s exhausted before connect{t}, not checked".format(
+                s=timeout,
+                t=" to {t}".format(t=target) if target else ''
+            )
+        )
+        self.phase = 'connect'
+
+
+class RedisDeadline(object):
+    """
+    Time budget of a whole check run, every connect, AUTH and command
+    gets what is left of it as socket timeout
+    """
+    #seconds a check may run by default, under the usual plugin timeout
+    TIMEOUT = 8
+    #deadline of the running check, shared by all its connections
+    _current = None
+    #redis-py connection class -> its DeadlineConnectionMixin subclass
+    _connection_classes = {}
+
+    def __init__(
+            self,
+            timeout
+    ):
+        self.timeout = timeout
+        self.expires = TimingHelpers.monotonic() + timeout
+
+    @classmethod
+    def start(
             cls,
-            redis_con=None,
-            debug=False
+            timeout
     ):
-        if not isinstance(redis_con, redis.StrictRedis):
-            raise Exception("Cannot get maxmemory if not connected to redis")
+        """
+        :return: the deadline of this check run, started on the first call,
+                 later calls share it whatever their timeout
+        """
+        if cls._current is None:
+            cls._current = cls(timeout)
 
-        maxmemory = long(redis_con.config_get('maxmemory')['maxmemory'])
+        return cls._current
 
-        if debug:
-            print("Current maxmemory")
-            print("-----------------")
-            print(
-                "maxmemory: {m}".format(
-                    m=size(
-                        maxmemory,
-                        alternative
-                    )
+    @classmethod
+    def reset(cls):
+        """
+        Forget the deadline of the check run, the next start begins a new one
+        """
+        cls._current = None
+
+    def remaining(
+            self,
+            phase,
+            target=None
+    ):
+        """
+        :return: seconds left, raise RedisDeadlineError once expired, or
+                 RedisDeadlineExhaustedError when expired before a connect
+        """
+        remaining = self.expires - TimingHelpers.monotonic()
+        if remaining <= 0:
+            if phase == 'connect':
+                raise RedisDeadlineExhaustedError(self.timeout, target)
+            raise RedisDeadlineError(phase, self.timeout, target)
+
+        return remaining
+
+    @classmethod
+    def apply(
+            cls,
+            redis_con,
+            deadline
+    ):
+        """
+        Make every connection of redis_con pool timed and bound by the deadline
+        :type redis_con: redis.StrictRedis
+        :param deadline: RedisDeadline, None to only time the connections
+        """
+        pool = redis_con.connection_pool
+        pool.connection_class = cls.connection_class(pool.connection_class)
+        pool.connection_kwargs['deadline'] = deadline
+
+        return redis_con
+
+    @classmethod
+    def connection_class(
+            cls,
+            base
+    ):
+        """
+        :param base: redis-py connection class
+        :return: base with DeadlineConnectionMixin, created on first use
+        """
+        if base not in cls._connection_classes:
+            cls._connection_classes[base] = type(
+                'Deadline{n}'.format(n=base.__name__),
+                (DeadlineConnectionMixin, base),
+                {}
+            )
+
+        return cls._connection_classes[base]
+
+
+class DeadlineConnectionMixin(object):
+    """
+    Time each connection phase and command for --timings and, when the check
+    has a deadline, set the socket timeout of each phase to what is left of
+    it and name the phase when it expires
+    """
+
+    def __init__(
+            self,
+            deadline=None,
+            **kwargs
+    ):
+        super(DeadlineConnectionMixin, self).__init__(**kwargs)
+        self.deadline = deadline
+        self.phase = 'command'
+        self.command_name = None
+        self.command_mark = None
+
+    def _target(self):
+        if hasattr(self, 'path'):
+            return self.path
+
+        return "{h}:{p}".format(h=self.host, p=self.port)
+
+    def _settimeout(self):
+        if self.deadline is not None and self._sock:
+            self._sock.settimeout(self.deadline.remaining(self.phase, self._target()))
+
+    def _connect(self):
+        if self.deadline is not None:
+            self.socket_connect_timeout = self.deadline.remaining('connect', self._target())
+            self.socket_timeout = self.socket_connect_timeout
+
+        start_time = TimingHelpers.monotonic()
+        try:
+            return super(DeadlineConnectionMixin, self)._connect()
+        except socket.timeout:
+            if self.deadline is None:
+                raise
+            raise RedisDeadlineError('connect', self.deadline.timeout, self._target())
+        finally:
+            TimingHelpers.record_phase('connect', TimingHelpers.monotonic() - start_time)
+
+    def on_connect(self):
+        #the lazy connect of the first command sends AUTH/SELECT in between
+        #its naming and its sending, keep its name
+        command_name = self.command_name
+        self.phase = 'auth'
+        start_time = TimingHelpers.monotonic()
+        try:
+            super(DeadlineConnectionMixin, self).on_connect()
+        finally:
+            self.phase = 'command'
+            self.command_name = command_name
+            TimingHelpers.record_phase('auth', TimingHelpers.monotonic() - start_time)
+
+    def send_command(self, *args):
+        self.command_name = str(args[0]).lower().replace(' ', '_')
+        return super(DeadlineConnectionMixin, self).send_command(*args)
+
+    def pack_commands(self, commands):
+        #pipelines are timed as a whole, named after their commands
+        names = []
+        for args in commands:
+            name = str(args[0]).lower().replace(' ', '_')
+            if name not in names:
+                names.append(name)
+        self.command_name = '+'.join(names)
+
+        return super(DeadlineConnectionMixin, self).pack_commands(commands)
+
+    def send_packed_command(self, command):
+        import redis
+
+        if not self._sock:
+            self.connect()
+        try:
+            self._settimeout()
+            self.command_mark = TimingHelpers.monotonic()
+            return super(DeadlineConnectionMixin, self).send_packed_command(command)
+        except redis.TimeoutError:
+            if self.deadline is None:
+                raise
+            raise RedisDeadlineError(self.phase, self.deadline.timeout, self._target())
+        except RedisDeadlineError:
+            self.disconnect()
+            raise
+
+    def read_response(self):
+        import redis
+
+        try:
+            self._settimeout()
+            return super(DeadlineConnectionMixin, self).read_response()
+        except redis.TimeoutError:
+            if self.deadline is None:
+                raise
+            raise RedisDeadlineError(self.phase, self.deadline.timeout, self._target())
+        except RedisDeadlineError:
+            self.disconnect()
+            raise
+        finally:
+            #each pipeline response adds the time since the previous one
+            if self.phase == 'command' and self.command_mark is not None:
+                now = TimingHelpers.monotonic()
+                TimingHelpers.record_phase(
+                    'command_{n}'.format(n=self.command_name),
+                    now - self.command_mark
+                )
+                self.command_mark = now
+
+
+class RespError(Exception):
+    """
+    Error reply of redis to a RespClient command
+    """
+
+
+class RespConnectionError(Exception):
+    """
+    RespClient cannot reach redis
+    """
+
+
+class RespClient(object):
+    """
+    Minimal RESP client for the checks only sending PING, ECHO, INFO,
+    CONFIG GET and TIME, used with --resp so that a check run does not load redis-py.
+    Replies are parsed the way redis.StrictRedis does.
+    """
+
+    def __init__(
+            self,
+            host='localhost',
+            port=6379,
+            password=None,
+            db=0,
+            unix_socket_path=None,
+            socket_timeout=None,
+            socket_connect_timeout=None,
+            deadline=None
+    ):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.db = db
+        self.path = unix_socket_path
+        self.socket_timeout = socket_timeout
+        self.socket_connect_timeout = socket_connect_timeout or socket_timeout
+        self.deadline = deadline
+        self.instance = RedisCheckHelpers.instance_key(
+            unix_socket_path or host,
+            '' if unix_socket_path else port,
+            db
+        )
+        self._sock = None
+        self._file = None
+        self._pending = None
+
+    def __getattr__(self, name):
+        raise Exception(
+            "{n} is not served by the built-in RESP client, run the check without --resp".format(
+                n=name
+            )
+        )
+
+    def _target(self):
+        if self.path:
+            return self.path
+
+        return "{h}:{p}".format(h=self.host, p=self.port)
+
+    def _timeout(self, phase):
+        if self.deadline is not None:
+            return self.deadline.remaining(phase, self._target())
+
+        if phase == 'connect':
+            return self.socket_connect_timeout
+
+        return self.socket_timeout
+
+    def _timeout_error(self, phase):
+        if self.deadline is not None:
+            return RedisDeadlineError(phase, self.deadline.timeout, self._target())
+
+        return RespConnectionError("Timeout during {p} to {t}".format(p=phase, t=self._target()))
+
+    def connect(self):
+        self._connect()
+        self.on_connect()
+
+    def _connect(self):
+        """
+        TCP (or unix socket) connect
+        """
+        start_time = TimingHelpers.monotonic()
+        try:
+            if self.path:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self._timeout('connect'))
+                sock.connect(self.path)
+            else:
+                sock = socket.create_connection(
+                    (self.host, self.port),
+                    self._timeout('connect')
+                )
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except socket.timeout:
+            raise self._timeout_error('connect')
+        except socket.error as e:
+            raise RespConnectionError("Error connecting to {t}. {m}.".format(t=self._target(), m=e))
+        finally:
+            TimingHelpers.record_phase('connect', TimingHelpers.monotonic() - start_time)
+
+        self._sock = sock
+        self._file = sock.makefile('rb')
+
+    def on_connect(self):
+        """
+        AUTH and SELECT
+        """
+        commands = []
+        if self.password:
+            commands.append(('AUTH', self.password))
+        if self.db:
+            commands.append(('SELECT', self.db))
+        if commands:
+            start_time = TimingHelpers.monotonic()
+            try:
+                self.execute_commands(commands, phase='auth')
+            finally:
+                TimingHelpers.record_phase('auth', TimingHelpers.monotonic() - start_time)
+
+    def disconnect(self):
+        if self._sock is None:
+            return
+        try:
+            self._file.close()
+            self._sock.close()
+        except socket.error:
+            pass
+        self._sock = None
+        self._file = None
+
+    @staticmethod
+    def _pack(args):
+        packed = ['*{n}\r\n'.format(n=len(args))]
+        for arg in args:
+            if isinstance(arg, unicode):
+                arg = arg.encode('utf-8')
+            arg = str(arg)
+            packed.append('${n}\r\n{a}\r\n'.format(n=len(arg), a=arg))
+
+        return ''.join(packed)
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line.endswith('\r\n'):
+            raise socket.error("Connection closed by server")
+
+        kind, data = line[0], line[1:-2]
+        if kind == '+':
+            return data
+        if kind == '-':
+            return RespError(data)
+        if kind == ':':
+            return int(data)
+        if kind == '$':
+            if data == '-1':
+                return None
+            return self._file.read(int(data) + 2)[:-2]
+        if kind == '*':
+            if data == '-1':
+                return None
+            return [self._read_reply() for i in range(int(data))]
+
+        raise RespConnectionError("Protocol error from {t}: {l!r}".format(t=self._target(), l=line))
+
+    def _io(
+            self,
+            phase,
+            function,
+            *args
+    ):
+        """
+        Run a socket operation with the timeout left for phase, the
+        connection is closed when it fails
+        """
+        try:
+            self._sock.settimeout(self._timeout(phase))
+            return function(*args)
+        except socket.timeout:
+            self.disconnect()
+            raise self._timeout_error(phase)
+        except socket.error as e:
+            self.disconnect()
+            raise RespConnectionError("Error {p} on {t}. {m}.".format(p=phase, t=self._target(), m=e))
+        except RedisDeadlineError:
+            self.disconnect()
+            raise
+
+    @staticmethod
+    def command_names(commands):
+        """
+        :return: commands named like redis-py sends them, ex: 'info+config_get'
+        """
+        names = []
+        for args in commands:
+            #"CONFIG GET" is one command
+            name = '_'.join(str(arg).lower() for arg in args[:2 if args[0] == 'CONFIG' else 1])
+            if name not in names:
+                names.append(name)
+
+        return '+'.join(names)
+
+    def execute_commands(
+            self,
+            commands,
+            phase='command',
+            raise_on_error=True
+    ):
+        """
+        Send commands in one round trip
+        :param commands: list of command argument tuples
+        :param raise_on_error: raise the first error reply, otherwise return it
+        :return: list of replies
+        """
+        if self._sock is None:
+            self.connect()
+
+        start_time = TimingHelpers.monotonic()
+        try:
+            self._io(phase, self._sock.sendall, ''.join(self._pack(args) for args in commands))
+            replies = [self._io(phase, self._read_reply) for args in commands]
+        finally:
+            if phase == 'command':
+                TimingHelpers.record_phase(
+                    'command_{n}'.format(n=self.command_names(commands)),
+                    TimingHelpers.monotonic() - start_time
                 )
+
+        if raise_on_error:
+            for reply in replies:
+                if isinstance(reply, RespError):
+                    raise reply
+
+        return replies
+
+    def send_command(self, *args):
+        """
+        Send one command on the open connection, see open_connection, its
+        reply is read by read_response
+        """
+        self._pending = (args, TimingHelpers.monotonic())
+        self._io('command', self._sock.sendall, self._pack(args))
+
+    def read_response(self):
+        args, start_time = self._pending
+        try:
+            reply = self._io('command', self._read_reply)
+        finally:
+            TimingHelpers.record_phase(
+                'command_{n}'.format(n=self.command_names([args])),
+                TimingHelpers.monotonic() - start_time
             )
 
-        if maxmemory == 0:
-            raise Exception("maxmemory = 0 cannot evaluate usage")
+        if isinstance(reply, RespError):
+            raise reply
+
+        return reply
+
+    @staticmethod
+    def parse_info(response):
+        """
+        Parse an INFO reply into a dict, like redis.client.parse_info
+        """
+        def get_value(value):
+            if ',' not in value or '=' not in value:
+                try:
+                    if '.' in value:
+                        return float(value)
+                    return int(value)
+                except ValueError:
+                    return value
+
+            sub_dict = {}
+            for item in value.split(','):
+                k, v = item.rsplit('=', 1)
+                sub_dict[k] = get_value(v)
+            return sub_dict
+
+        info = {}
+        for line in response.splitlines():
+            if line and not line.startswith('#'):
+                if ':' in line:
+                    key, value = line.split(':', 1)
+                    info[key] = get_value(value)
+                else:
+                    info.setdefault('__raw__', []).append(line)
+
+        return info
+
+    @staticmethod
+    def parse_config_get(response):
+        return dict(zip(response[::2], response[1::2]))
+
+    def pipeline(
+            self,
+            transaction=False
+    ):
+        return RespPipeline(self)
+
+    def ping(self):
+        return self.pipeline().ping().execute()[0]
+
+    def echo(self, value):
+        return self.pipeline().echo(value).execute()[0]
+
+    def info(self, section=None):
+        return self.pipeline().info(section).execute()[0]
+
+    def config_get(self, pattern='*'):
+        return self.pipeline().config_get(pattern).execute()[0]
+
+    def time(self):
+        return self.pipeline().time().execute()[0]
+
+
+class RespPipeline(object):
+    """
+    Commands of a RespClient sent in one round trip
+    """
+
+    def __init__(
+            self,
+            client
+    ):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        raise Exception(
+            "{n} is not served by the built-in RESP client, run the check without --resp".format(
+                n=name
+            )
+        )
+
+    def ping(self):
+        self.commands.append((('PING',), lambda reply: reply == 'PONG'))
+        return self
+
+    def echo(self, value):
+        self.commands.append((('ECHO', value), None))
+        return self
+
+    def info(self, section=None):
+        args = ('INFO', section) if section else ('INFO',)
+        self.commands.append((args, RespClient.parse_info))
+        return self
+
+    def config_get(self, pattern='*'):
+        self.commands.append((('CONFIG', 'GET', pattern), RespClient.parse_config_get))
+        return self
+
+    def time(self):
+        self.commands.append((('TIME',), lambda reply: (int(reply[0]), int(reply[1]))))
+        return self
+
+    def execute(
+            self,
+            raise_on_error=True
+    ):
+        replies = self.client.execute_commands(
+            [args for args, callback in self.commands],
+            raise_on_error=raise_on_error
+        )
+        self.commands, commands = [], self.commands
+
+        return [
+            reply if callback is None or isinstance(reply, RespError) else callback(reply)
+            for (args, callback), reply in zip(commands, replies)
+        ]
 
-        return maxmemory
 
 class OutputFormatHelpers(object):
     @classmethod
@@ -161,7 +2928,9 @@ class OutputFormatHelpers(object):
         :type perfdata: Array
         :return: check output formated string
         """
-        if state not in ['Critical', 'Warning', 'OK', 'Unknown']:
+        start_time = TimingHelpers.monotonic()
+
+        if state not in NAGIOS_STATES:
             raise Exception("bad check output state")
 
         if not message:
@@ -177,8 +2946,123 @@ class OutputFormatHelpers(object):
             output_template = "{s}: {m} "
             perfdata_string = ''
 
-        return output_template.format(
+        output = output_template.format(
             s=state,
             m=message,
             d=perfdata_string
         )
+
+        TimingHelpers.record_phase('output', TimingHelpers.monotonic() - start_time)
+
+        return output
+
+    @classmethod
+    def add_perf_data(
+            cls,
+            output,
+            perfdata
+    ):
+        """
+        Add perf data to the first line of a formated check output
+        :param output: check output string
+        :param perfdata: Array of perf data string
+        :return: check output formated string
+        """
+        lines = output.split('\n')
+        perfdata_string = ''.join(' {s} '.format(s=data) for data in perfdata)
+
+        if '|' in lines[0]:
+            lines[0] += perfdata_string
+        else:
+            lines[0] += '|' + perfdata_string
+
+        return '\n'.join(lines)
+
+    @classmethod
+    def worst_state(
+            cls,
+            states
+    ):
+        """
+        Aggregate several check states into the most severe one
+        :param states: Iterable of states in ['Critical', 'Warning', 'OK', 'Unknown']
+        :return: most severe state, Critical > Warning > Unknown > OK
+        """
+        severity = ['OK', 'Unknown', 'Warning', 'Critical']
+        worst = 'OK'
+
+        for state in states:
+            if state not in NAGIOS_STATES:
+                raise Exception("bad check output state")
+            if severity.index(state) > severity.index(worst):
+                worst = state
+
+        return worst
+
+    @classmethod
+    def prefix_perf_data(
+            cls,
+            prefix,
+            perfdata
+    ):
+        """
+        Prefix the label of perf data strings, ex: 'used_memory' -> 'redis1:6379/used_memory'
+        :param prefix: label prefix
+        :param perfdata: Array of perf data string
+        :return: Array of prefixed perf data string
+        """
+        return [
+            "'{p}/{d}".format(p=prefix, d=data[1:])
+            for data in perfdata or []
+        ]
+
+    @classmethod
+    def multi_host_output(
+            cls,
+            results,
+            summary=None
+    ):
+        """
+        Aggregate per host check results into one check output.
+        The first line holds the worst state and every host perf data,
+        the following lines hold one result per host.
+        :param results: list of (target, (status, message, perfdata))
+        :param summary: optional (status, message, perfdata) about the whole
+                        set of hosts, added to the first line
+        :return: (worst state, check output string)
+        """
+        status = cls.worst_state(
+            [host_status for target, (host_status, message, perfdata) in results] +
+            ([summary[0]] if summary else [])
+        )
+
+        perfdata = list(summary[2]) if summary else []
+        host_lines = []
+        failed = 0
+        for target, (host_status, message, host_perfdata) in results:
+            perfdata.extend(cls.prefix_perf_data(target, host_perfdata))
+            host_lines.append(
+                '{t} {s}: {m}'.format(t=target, s=host_status, m=message)
+            )
+            if host_status != 'OK':
+                failed += 1
+
+        message = '{ok}/{n} hosts OK'.format(
+            ok=len(results) - failed,
+            n=len(results)
+        )
+        if summary:
+            message = '{s}, {m}'.format(s=summary[1], m=message)
+
+        output = cls.check_output_string(
+            status,
+            message,
+            perfdata or None
+        )
+
+        return status, '\n'.join([output] + host_lines)
+
+
+#time to load the interpreter then redis_checks and its dependencies
+TimingHelpers.record_phase('startup', TimingHelpers.process_age(IMPORT_START) or 0)
+TimingHelpers.record_phase('imports', time.time() - IMPORT_START)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015:
+#     Sébastien Pasche, sebastien.pasche@leshop.ch
+#     Benoit Chalut, benoit.chalut@leshop.ch
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+
+author = "Sebastien Pasche"
+maintainer = "Sebastien Pasche"
+version = "0.0.1"
+
+import os
+import mmap
+import struct
+import fcntl
+
+
+class RingBufferHistory(object):
+    """
+    Fixed size history of (timestamp, value) samples in a memory mapped file.
+    Records are packed doubles at a fixed offset, appending a sample is one
+    in place record write plus the header counter, reading the last samples
+    is a struct unpack of the mapped records.
+    """
+    MAGIC = b'RRB1'
+    #magic, header version, record size, capacity, samples appended since creation
+    HEADER = struct.Struct('<4sHHIQ')
+    HEADER_SIZE = 32
+    RECORD = struct.Struct('<dd')
+
+    def __init__(
+            self,
+            path,
+            capacity
+    ):
+        """
+        Open the history file, created empty if missing and replaced by an
+        empty one if of another capacity
+        :param path: history file path
+        :param capacity: number of samples kept
+        """
+        if capacity < 1:
+            raise Exception("History capacity must be at least 1")
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+
+        self.path = path
+        self.capacity = capacity
+        self.size = self.HEADER_SIZE + capacity * self.RECORD.size
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self.fd).st_size == 0:
+                    self._initialize(self.fd)
+                elif not self._valid_header():
+                    #replace the file rather than truncate it, other checks
+                    #may have it mapped and would get SIGBUS
+                    fd = self._replace()
+                    os.close(self.fd)
+                    self.fd = fd
+                self.map = mmap.mmap(self.fd, self.size)
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        except:
+            os.close(self.fd)
+            raise
+
+    def _initialize(
+            self,
+            fd
+    ):
+        os.ftruncate(fd, self.size)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(
+            fd,
+            self.HEADER.pack(self.MAGIC, 1, self.RECORD.size, self.capacity, 0)
+        )
+
+    def _replace(self):
+        """
+        Create an empty history file and rename it over path
+        :return: locked file descriptor of the new file
+        """
+        tmp_path = "{p}.{pid}.tmp".format(p=self.path, pid=os.getpid())
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            self._initialize(fd)
+            os.rename(tmp_path, self.path)
+        except:
+            os.close(fd)
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        return fd
+
+    def _valid_header(self):
+        if os.fstat(self.fd).st_size != self.size:
+            return False
+
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        header = os.read(self.fd, self.HEADER.size)
+        if len(header) != self.HEADER.size:
+            return False
+
+        magic, header_version, record_size, capacity, count = self.HEADER.unpack(header)
+
+        return (
+            magic == self.MAGIC and
+            header_version == 1 and
+            record_size == self.RECORD.size and
+            capacity == self.capacity
+        )
+
+    def _count(self):
+        return self.HEADER.unpack_from(self.map, 0)[4]
+
+    def append(
+            self,
+            timestamp,
+            value
+    ):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            count = self._count()
+            self.RECORD.pack_into(
+                self.map,
+                self.HEADER_SIZE + (count % self.capacity) * self.RECORD.size,
+                timestamp,
+                value
+            )
+            self.HEADER.pack_into(
+                self.map,
+                0,
+                self.MAGIC, 1, self.RECORD.size, self.capacity, count + 1
+            )
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def last(
+            self,
+            n=None
+    ):
+        """
+        :param n: number of samples, None for every kept sample
+        :return: list of the last n (timestamp, value) samples, oldest first
+        """
+        fcntl.flock(self.fd, fcntl.LOCK_SH)
+        try:
+            count = self._count()
+            kept = min(count, self.capacity)
+            if n is not None:
+                kept = min(kept, n)
+
+            return [
+                self.RECORD.unpack_from(
+                    self.map,
+                    self.HEADER_SIZE + (index % self.capacity) * self.RECORD.size
+                )
+                for index in range(count - kept, count)
+            ]
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, the_type, value, tb):
+        self.close()
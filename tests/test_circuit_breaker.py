@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import optparse
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from redis_checks import RedisCheckHelpers, RedisDeadline, RedisStateStore
+
+
+def ping(redis_con, debug=False):
+    redis_con.ping()
+    return "OK", "pong", []
+
+
+def unused_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class SharedDeadlineBreakerTest(unittest.TestCase):
+    """
+    A slow target using the whole --timeout budget of a fan-out must not be
+    charged to the targets queued behind it
+    """
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+
+        #accepts connections (kernel backlog) but never replies
+        self.slow = socket.socket()
+        self.slow.bind(('127.0.0.1', 0))
+        self.slow.listen(5)
+        self.slow_port = self.slow.getsockname()[1]
+
+        RedisDeadline.reset()
+
+    def tearDown(self):
+        RedisDeadline.reset()
+        self.slow.close()
+        shutil.rmtree(self.state_dir)
+
+    def parse(self, *args):
+        parser = RedisCheckHelpers.add_default_parser_options(optparse.OptionParser())
+        opts, args = parser.parse_args(
+            list(args) + ['--state-dir', self.state_dir, '--workers', '1']
+        )
+        return opts
+
+    def failures(self, port):
+        state = RedisStateStore.load(
+            self.state_dir,
+            'breaker',
+            RedisCheckHelpers.instance_key('127.0.0.1', port)
+        )
+        return state['failures'] if state else 0
+
+    def test_queued_targets_not_charged(self):
+        queued_ports = [unused_port(), unused_port()]
+        opts = self.parse('--timeout', '0.2')
+        targets = [('127.0.0.1', self.slow_port)] + [('127.0.0.1', port) for port in queued_ports]
+
+        #up to the slow target breaker opening, queued targets are then reached
+        for run in range(opts.breaker_failures):
+            RedisDeadline.reset()
+            results = RedisCheckHelpers.fan_out(targets, ping, opts, use_snapshot=False)
+
+            for target, (status, message, perfdata) in results[1:]:
+                self.assertIn("not checked", message)
+
+        self.assertEqual(self.failures(self.slow_port), opts.breaker_failures)
+        for port in queued_ports:
+            self.assertEqual(self.failures(port), 0)
+
+    def test_connection_failure_charged(self):
+        port = unused_port()
+        opts = self.parse('--timeout', '1')
+
+        results = RedisCheckHelpers.fan_out([('127.0.0.1', port)], ping, opts, use_snapshot=False)
+
+        self.assertEqual(results[0][1][0], "Critical")
+        self.assertEqual(self.failures(port), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()